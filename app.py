@@ -1,7 +1,15 @@
-from flask import Flask, render_template, request, redirect, url_for, jsonify, session
+from flask import Flask, render_template, request, redirect, url_for, jsonify, session, g
+import atexit
+import functools
+import hashlib
+import os
+import queue
+import re
 import sqlite3
+import tempfile
+import threading
+from contextlib import contextmanager
 from pathlib import Path
-from werkzeug.utils import secure_filename
 from datetime import datetime, timedelta
 from urllib.parse import urlparse
 from zoneinfo import ZoneInfo
@@ -18,42 +26,319 @@ app = Flask(__name__)
 app.config["UPLOAD_FOLDER"] = UPLOAD_FOLDER
 app.secret_key = "dev-secret-change-me"
 
+# ---------------------------------------------------------
+# Connection pool
+# ---------------------------------------------------------
+class ConnectionPool:
+    """
+    Bounded pool of long-lived SQLite connections: N readers + 1 writer.
+    Connections stay open for the process lifetime so each request skips
+    the open/close syscalls and page-cache warm-up of a fresh connection.
+
+    Under WAL the readers run concurrently with each other and with the
+    writer, so read-heavy views scale across server threads up to
+    read_size (overridable via EHR_READ_POOL_SIZE for deployments that
+    run more worker threads than cores).
+    """
+
+    def __init__(self, db_path, read_size=None):
+        self.read_size = read_size or (os.cpu_count() or 4)
+        self._db_path = db_path
+        self._readers = queue.Queue()
+        self._writers = queue.Queue()
+        self._all_connections = []
+        # The writer goes first: it creates the file if needed and flips
+        # the (persistent) journal mode to WAL before any read-only
+        # handle is opened against it.
+        self._writers.put(self._new_connection())
+        for _ in range(self.read_size):
+            self._readers.put(self._new_connection(readonly=True))
+
+    def _new_connection(self, readonly=False):
+        # cached_statements=256 keeps every distinct SQL string in the app
+        # prepared for the connection's lifetime (default cache is 128).
+        # Readers are opened mode=ro so a stray write on a pooled reader
+        # fails loudly instead of blocking on the writer lock.
+        if readonly:
+            conn = sqlite3.connect(f"file:{self._db_path}?mode=ro", uri=True,
+                                   check_same_thread=False, cached_statements=256)
+        else:
+            conn = sqlite3.connect(self._db_path, check_same_thread=False,
+                                   cached_statements=256)
+        conn.row_factory = sqlite3.Row
+        # WAL lets the alert/priority SELECTs run concurrently with the
+        # flowsheet INSERTs; synchronous=NORMAL halves fsyncs on writes;
+        # the 20MB cache keeps the patients/assessments/medications hot
+        # set resident so repeated lookups stay memory-bound. Setting the
+        # journal mode needs write access, so only the writer does it.
+        if not readonly:
+            conn.execute("PRAGMA journal_mode=WAL;")
+        conn.executescript("""
+            PRAGMA synchronous=NORMAL;
+            PRAGMA busy_timeout=5000;
+            PRAGMA cache_size=-20000;
+            PRAGMA mmap_size=268435456;
+            PRAGMA temp_store=memory;
+            PRAGMA foreign_keys=ON;
+        """)
+        self._all_connections.append(conn)
+        return conn
+
+    @contextmanager
+    def connection(self, write=False):
+        pool = self._writers if write else self._readers
+        conn = pool.get()
+        try:
+            yield conn
+        finally:
+            # Never hand a connection back mid-transaction: an aborted
+            # write would be committed by the next borrower, and an open
+            # read snapshot would pin the WAL.
+            if conn.in_transaction:
+                conn.rollback()
+            pool.put(conn)
+
+    def close_all(self):
+        for conn in self._all_connections:
+            try:
+                # Refresh the planner's stat tables on the way out so the
+                # next process start plans against current row counts.
+                conn.execute("PRAGMA optimize;")
+                conn.close()
+            except sqlite3.Error:
+                pass
+
+
+_pool = ConnectionPool(DB_PATH, read_size=int(os.environ.get("EHR_READ_POOL_SIZE", 0)) or None)
+atexit.register(_pool.close_all)
+
+
 # ---------------------------------------------------------
 # Helpers
 # ---------------------------------------------------------
-def get_connection():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+def get_connection(write=False):
+    """Hand out a pooled connection as a context manager."""
+    return _pool.connection(write=write)
+
+# Exact description → category for every task the app schedules. The
+# normalized category column lets the flowsheet complete a whole class
+# of tasks with an index probe instead of a chain of LIKE scans.
+_TASK_CATEGORIES = {
+    "Vitalzeichen nach Standard": "vitals",
+    "SpO₂ & AF alle 2h dokumentieren": "vitals",
+    "RR & Puls alle 2h kontrollieren": "vitals",
+    "Schmerzen täglich nachfragen": "pain",
+    "Schmerzskala alle 4h erheben": "pain",
+    "Gewicht täglich messen": "weight",
+    "Lagerung alle 2h dokumentieren": "positioning",
+    "Oberkörperhochlagerung": "positioning",
+    "Sturzrisiko einschätzen": "falls",
+    "Orientierungshilfen bereitstellen": "orientation",
+}
+
+
+def init_db():
+    """
+    One-time startup migration for databases seeded by older versions:
+    adds the medication documentation columns, the task category column
+    and the hot-path indexes. Safe to run repeatedly.
+    """
+    with get_connection(write=True) as conn:
+        cur = conn.cursor()
+
+        med_cols = {r["name"] for r in cur.execute("PRAGMA table_info(medications);")}
+        if "given" not in med_cols:
+            cur.execute("ALTER TABLE medications ADD COLUMN given INTEGER DEFAULT 0;")
+        if "not_given" not in med_cols:
+            cur.execute("ALTER TABLE medications ADD COLUMN not_given INTEGER DEFAULT 0;")
+
+        task_cols = {r["name"] for r in cur.execute("PRAGMA table_info(ai_tasks);")}
+        if "category" not in task_cols:
+            cur.execute("ALTER TABLE ai_tasks ADD COLUMN category TEXT;")
+        # backfill by exact description so free-text task rows (voice
+        # documentation) stay uncategorized; runs unconditionally so
+        # rows that predate the column (or were seeded without a
+        # category) get one even when the column already exists
+        cur.executemany(
+            "UPDATE ai_tasks SET category = ? WHERE description = ? AND category IS NULL;",
+            [(cat, desc) for desc, cat in _TASK_CATEGORIES.items()])
+
+        # Collapse historical open duplicates so the partial unique
+        # index below can be created; keep the newest row of each pair.
+        cur.execute("""
+            DELETE FROM ai_tasks
+            WHERE completed = 0
+              AND id NOT IN (
+                  SELECT MAX(id)
+                  FROM ai_tasks
+                  WHERE completed = 0
+                  GROUP BY patient_id, description
+              );
+        """)
+
+        cur.executescript("""
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_ai_tasks_open_uniq
+                ON ai_tasks(patient_id, description) WHERE completed = 0;
+            CREATE INDEX IF NOT EXISTS idx_ai_tasks_pid_open
+                ON ai_tasks(patient_id) WHERE completed = 0;
+            CREATE INDEX IF NOT EXISTS idx_assessments_pid_created
+                ON assessments(patient_id, created_at DESC);
+            CREATE INDEX IF NOT EXISTS idx_nurse_notes_pid_created
+                ON nurse_notes(patient_id, created_at DESC);
+            CREATE INDEX IF NOT EXISTS idx_ai_alerts_pid_created
+                ON ai_alerts(patient_id, created_at DESC);
+            CREATE INDEX IF NOT EXISTS idx_med_admin_pid_given
+                ON med_administrations(patient_id, given_at DESC);
+            CREATE INDEX IF NOT EXISTS idx_ai_tasks_pid_desc_due
+                ON ai_tasks(patient_id, description, due_time) WHERE completed = 0;
+            CREATE INDEX IF NOT EXISTS idx_medications_open_due
+                ON medications(patient_id, name, schedule, next_due)
+                WHERE given = 0 AND not_given = 0;
+            CREATE INDEX IF NOT EXISTS idx_lab_orders_status_ordered
+                ON lab_orders(status, ordered_at DESC);
+            CREATE INDEX IF NOT EXISTS idx_lab_orders_pid_status_ordered
+                ON lab_orders(patient_id, status, ordered_at DESC);
+            CREATE INDEX IF NOT EXISTS idx_lab_results_dt
+                ON lab_results(result_datetime DESC);
+            CREATE INDEX IF NOT EXISTS idx_lab_results_pid_dt
+                ON lab_results(patient_id, result_datetime DESC);
+            CREATE INDEX IF NOT EXISTS idx_ai_tasks_pid_category
+                ON ai_tasks(patient_id, category) WHERE completed = 0;
+            CREATE INDEX IF NOT EXISTS idx_med_admin_pid_nurse
+                ON med_administrations(patient_id, nurse_id);
+            CREATE INDEX IF NOT EXISTS idx_ai_tasks_pid_due
+                ON ai_tasks(patient_id, due_time);
+            CREATE INDEX IF NOT EXISTS idx_orders_pid_due
+                ON orders(patient_id, due_date);
+            CREATE INDEX IF NOT EXISTS idx_medications_pid_next_due
+                ON medications(patient_id, next_due);
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_patients_ident_cover
+                ON patients(patient_identifier, name);
+        """)
+        # refresh planner statistics so the partial/composite indexes
+        # above actually get picked over full scans
+        cur.execute("ANALYZE;")
+        conn.commit()
+
+
+init_db()
+
+
+def _begin_immediate(conn):
+    """
+    Take the write lock up front so a delete+insert rebuild commits as a
+    single transaction (one fsync) and can't hit SQLITE_BUSY halfway
+    through. No-op when the caller already has a transaction open.
+    """
+    if not conn.in_transaction:
+        conn.execute("BEGIN IMMEDIATE;")
+
+def chunked_executemany(cur, sql, rows, params_per_row, max_params=500):
+    """
+    executemany in slices so a single batch stays well under SQLite's
+    host-parameter cap when row counts scale up (ward-wide rebuilds,
+    admission imports, ...).
+    """
+    rows = list(rows)
+    per_chunk = max(1, max_params // params_per_row)
+    for i in range(0, len(rows), per_chunk):
+        cur.executemany(sql, rows[i:i + per_chunk])
 
 def allowed_file(filename: str) -> bool:
     return "." in filename and filename.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS
 
+# Nurses are only ever written by the seed script, so rows fetched once
+# can be reused across requests; select_nurse clears this on POST as the
+# natural re-login point.
+_nurse_cache = {}
+
+# patient_identifier values are only ever written by the seed script,
+# so an identifier resolved once stays valid for the process lifetime;
+# unknown identifiers still hit the DB every time (and stay unknown).
+_patients_by_identifier = {}
+
+def patient_by_identifier(conn, identifier):
+    """(id, name) for a known identifier, cached for the process."""
+    hit = _patients_by_identifier.get(identifier)
+    if hit is None:
+        cur = conn.cursor()
+        cur.execute("SELECT id, name FROM patients WHERE patient_identifier = ?;",
+                    (identifier,))
+        row = cur.fetchone()
+        if row is None:
+            return None
+        hit = (row["id"], row["name"])
+        _patients_by_identifier[identifier] = hit
+    return hit
+
+def patient_id_by_identifier(conn, identifier):
+    hit = patient_by_identifier(conn, identifier)
+    return hit[0] if hit else None
+
 def get_current_nurse(conn=None):
     nurse_id = session.get("current_nurse_id")
     if not nurse_id:
         return None
 
-    close_conn = False
-    if conn is None:
-        conn = get_connection()
-        close_conn = True
-
-    cur = conn.cursor()
-    cur.execute("SELECT id, name FROM nurses WHERE id = ?;", (nurse_id,))
-    nurse = cur.fetchone()
+    # Cached on g for the rest of the request — the flowsheet POST alone
+    # asks for the current nurse three times.
+    if getattr(g, "_current_nurse_id", None) == nurse_id:
+        return g._current_nurse
 
-    if close_conn:
-        conn.close()
+    nurse = _nurse_cache.get(nurse_id)
+    if nurse is None:
+        if conn is None:
+            with get_connection() as conn:
+                nurse = _query_nurse(conn, nurse_id)
+        else:
+            nurse = _query_nurse(conn, nurse_id)
+        if nurse is not None:
+            _nurse_cache[nurse_id] = nurse
 
+    g._current_nurse_id = nurse_id
+    g._current_nurse = nurse
     return nurse
 
+def _query_nurse(conn, nurse_id):
+    cur = conn.cursor()
+    cur.execute("SELECT id, name FROM nurses WHERE id = ?;", (nurse_id,))
+    return cur.fetchone()
+
 LOCAL_TZ = ZoneInfo("Europe/Berlin")
 
 def now_local():
     return datetime.now(LOCAL_TZ)
 
 
+# SQL shared by several views. One module-level text (instead of
+# per-handler copies differing only in whitespace) means every caller
+# hits the same slot in the connections' prepared-statement cache.
+SQL_ALERTS_BY_PID = """
+    SELECT alert, severity, created_at
+    FROM ai_alerts
+    WHERE patient_id = ?
+    ORDER BY created_at DESC, id DESC
+    LIMIT 50;
+"""
+
+SQL_PATIENT_LIST = """
+    SELECT id, name, patient_identifier
+    FROM patients
+    ORDER BY room;
+"""
+
+# Advances (or rolls back) medications.next_due by :step directly in
+# SQLite's C date code. Full timestamps ("T" or space separated) go
+# straight through strftime, legacy "HH:MM" values are anchored to
+# today, anything else falls back to the Python-computed :fallback.
+SQL_MED_NEXT_DUE_EXPR = """
+    coalesce(strftime('%Y-%m-%dT%H:%M',
+                      CASE WHEN next_due LIKE '%-%' THEN next_due
+                           ELSE date('now', 'localtime') || 'T' || next_due END,
+                      :step), :fallback)
+"""
+
+
 def _safe_referrer(default_endpoint="home"):
     ref = request.referrer
     if not ref:
@@ -81,7 +366,13 @@ def _referrer_is_patient_page_for(patient_id: int) -> bool:
     return False
 
 def _get_tabs():
-    return session.get("patient_tabs", [])
+    tabs = session.get("patient_tabs", [])
+    # lazy migration: cookies minted before ids were normalized carry
+    # patient_id as a string; coerce in place so comparisons stay direct
+    for t in tabs:
+        if not isinstance(t.get("patient_id"), int):
+            t["patient_id"] = int(t["patient_id"])
+    return tabs
 
 def _set_tabs(tabs):
     session["patient_tabs"] = tabs
@@ -90,8 +381,21 @@ def _set_active_patient_id(pid):
     session["active_patient_id"] = pid
 
 
-def add_patient_tab(patient_id: int, patient_name: str, url: str):
-    tabs = session.get("patient_tabs", [])
+def open_patient_tab(patient_id: int, patient_name: str, url: str):
+    """
+    Record the patient as the most recent (and active) tab. Tab list and
+    active id are written in one place, and re-visiting the same page of
+    the already-active patient skips the session mutation entirely so
+    the cookie isn't re-serialized on every GET.
+    """
+    patient_id = int(patient_id)
+    tabs = _get_tabs()
+
+    if (session.get("active_patient_id") == patient_id
+            and tabs
+            and tabs[-1].get("patient_id") == patient_id
+            and tabs[-1].get("url") == url):
+        return
 
     # remove if already exists (so we can re-add to end = most recent)
     tabs = [t for t in tabs if t.get("patient_id") != patient_id]
@@ -103,131 +407,192 @@ def add_patient_tab(patient_id: int, patient_name: str, url: str):
     })
 
     # keep last 5 open patients
-    tabs = tabs[-5:]
-    session["patient_tabs"] = tabs
-
-def set_active_patient(patient_id: int):
+    session["patient_tabs"] = tabs[-5:]
     session["active_patient_id"] = patient_id
 
 
+# Compiled once at import time: a single C-level regex scan replaces the
+# chain of "substring in s" checks that ran on every schedule/description
+# parse (hot during flowsheet POSTs and task toggles).
+_EVERY_N_HOURS_RE = re.compile(r"alle\s*([124])\s*h")
+_TIMES_DAILY_RE = re.compile(r"([123])\s*x\s*täglich")
+_DAYPART_RE = re.compile(r"morgens|abends|nachts")
+_TIMES_DAILY_HOURS = {"1": 24, "2": 6, "3": 8}
+
+
+# Both interval parsers are memoized: they run on every toggle and task
+# rebuild, but their inputs are drawn from a handful of fixed schedule /
+# description strings.
+@functools.lru_cache(maxsize=256)
 def get_med_interval_hours(schedule: str | None) -> int:
     if not schedule:
         return 8  # fallback
 
     s = schedule.lower()
 
-    if "alle 1h" in s or "alle 1 h" in s:
-        return 1
-    if "alle 2h" in s or "alle 2 h" in s:
-        return 2
-    if "alle 4h" in s or "alle 4 h" in s:
-        return 4
+    m = _EVERY_N_HOURS_RE.search(s)
+    if m:
+        return int(m.group(1))
 
-    if "1x täglich" in s or "1 x täglich" in s:
-        return 24
-    if "2x täglich" in s or "2 x täglich" in s:
-        return 6
-    if "3x täglich" in s or "3 x täglich" in s:
-        return 8
+    m = _TIMES_DAILY_RE.search(s)
+    if m:
+        return _TIMES_DAILY_HOURS[m.group(1)]
 
-    if "morgens" in s or "abends" in s or "nachts" in s:
+    if _DAYPART_RE.search(s):
         return 24
 
     return 8
 
 
+# Vital-sign rules as data: (column, predicate, message, severity).
+# A single table-driven pass replaces the hand-unrolled if-chain in
+# generate_ai_alerts and keeps thresholds reviewable in one place.
+_VITAL_ALERT_RULES = [
+    ("temperature", lambda v: v >= 38.5,
+     "Fieber: bitte Infekt abklären", "warning"),
+    ("oxygen_sat", lambda v: v < 90,
+     "Schwere Hypoxie! O₂-Gabe prüfen", "critical"),
+    ("systolic_bp", lambda v: v < 90,
+     "Hypotonie – Gefahr einer Schocksituation", "critical"),
+    ("systolic_bp", lambda v: v > 175,
+     "Hypertonie – Organbeschädigungsrisiko", "critical"),
+    ("heart_rate", lambda v: v > 120,
+     "Tachykardie: mögliche Schmerzen, Fieber oder Hypovolämie", "warning"),
+    ("heart_rate", lambda v: v < 60,
+     "Bradykardie: Gefahr einer Schocksituation", "critical"),
+]
+
+
+# Allergy/intolerance symptom keywords, compiled once so the nurse-note
+# scan is a single pass instead of one substring search per keyword.
+_ALLERGY_SYMPTOM_RE = re.compile(r"juckreiz|juckende haut|haut juckt")
+
+# Per-patient fingerprint of the inputs the alert rules read. When the
+# fingerprint hasn't moved since the last rebuild, the whole rule
+# evaluation and the delete+insert cycle are skipped.
+_ALERT_FINGERPRINTS = {}
+
+
+def get_latest_assessment(conn, patient_id):
+    """
+    Newest assessment row for a patient. The alert and priority
+    generators both need it, usually back to back in the same request,
+    so the row is cached on g keyed by MAX(id) — a cheap index probe
+    that doubles as invalidation when the flowsheet POST inserts a new
+    assessment earlier in the same request.
+    """
+    cur = conn.cursor()
+    cur.execute("SELECT MAX(id) FROM assessments WHERE patient_id = ?;", (patient_id,))
+    key = (patient_id, cur.fetchone()[0])
+
+    cache = getattr(g, "_latest_assessments", None)
+    if cache is None:
+        cache = g._latest_assessments = {}
+    if key not in cache:
+        cur.execute("""
+            SELECT *
+            FROM assessments
+            WHERE patient_id = ?
+            ORDER BY created_at DESC, id DESC
+            LIMIT 1;
+        """, (patient_id,))
+        cache[key] = cur.fetchone()
+    return cache[key]
+
+
 def generate_ai_alerts(conn, patient_id):
-    conn.row_factory = sqlite3.Row
     cur = conn.cursor()
 
-    # get the last assessment
-    cur.execute("""
-        SELECT *
-        FROM assessments
-        WHERE patient_id = ?
-        ORDER BY datetime(created_at) DESC, id DESC
-        LIMIT 1;
-    """, (patient_id,))
-    a = cur.fetchone()
+    # Plain-tuple cursor for the scans below that never dereference
+    # columns by name — skips the per-row sqlite3.Row allocation.
+    tuple_cur = conn.cursor()
+    tuple_cur.row_factory = None
+
+    tuple_cur.execute("""
+        SELECT (SELECT MAX(id) FROM assessments WHERE patient_id = ?),
+               (SELECT COUNT(*) FROM medications WHERE patient_id = ?),
+               (SELECT MAX(id) FROM nurse_notes WHERE patient_id = ?);
+    """, (patient_id, patient_id, patient_id))
+    fingerprint = tuple_cur.fetchone()
+    if _ALERT_FINGERPRINTS.get(patient_id) == fingerprint:
+        return
+
+    # get the last assessment — shared with the priority generator via
+    # the per-request cache, so back-to-back generator runs fetch it once
+    a = get_latest_assessment(conn, patient_id)
     if not a:
         return
 
+    # qSOFA is a fixed boolean on RR/SBP/GCS; unmeasured vitals count 0
+    rr, sbp, confusion = a["respiration_rate"], a["systolic_bp"], a["confusion"]
+    qsofa = ((rr is not None and rr >= 22)
+             + (sbp is not None and 0 < sbp < 100)
+             + (confusion is not None and confusion >= 5))
+
     alerts = []
 
     # -------------------------
     # 1. VITAL SIGN WARNINGS
     # -------------------------
-    if a["temperature"] and a["temperature"] >= 38.5:
-        alerts.append(("Fieber: bitte Infekt abklären", "warning"))
-
-    if a["oxygen_sat"] and a["oxygen_sat"] < 90:
-        alerts.append(("Schwere Hypoxie! O₂-Gabe prüfen", "critical"))
-
-    if a["systolic_bp"] and a["systolic_bp"] < 90:
-        alerts.append(("Hypotonie – Gefahr einer Schocksituation", "critical"))
-
-    if a["systolic_bp"] and a["systolic_bp"] > 175:
-        alerts.append(("Hypertonie – Organbeschädigungsrisiko", "critical"))
-
-    if a["heart_rate"] and a["heart_rate"] > 120:
-        alerts.append(("Tachykardie: mögliche Schmerzen, Fieber oder Hypovolämie", "warning"))
-
-    if a["heart_rate"] and a["heart_rate"] <60:
-        alerts.append(("Bradykardie: Gefahr einer Schocksituation", "critical"))
+    for column, predicate, message, severity in _VITAL_ALERT_RULES:
+        value = a[column]
+        if value and predicate(value):
+            alerts.append((message, severity))
 
     # -------------------------
     # 2. SEPSIS EARLY WARNING
     # -------------------------
-    qsofa = 0
-    if a["respiration_rate"] and a["respiration_rate"] >= 22:
-        qsofa += 1
-    if a["systolic_bp"] and a["systolic_bp"] < 100:
-        qsofa += 1
-    if a["confusion"] and a["confusion"] >= 5:
-        qsofa += 1
-
     if qsofa >= 2:
         alerts.append(("⚠️ Sepsisverdacht! Arzt sofort informieren.", "critical"))
 
-    # -------------------------
-    # 3. MEDICATION SAFETY
-    # -------------------------
-    # Example rule: hypotension + beta blocker
-    cur.execute("""
-        SELECT name FROM medications
-        WHERE patient_id = ?;
-    """, (patient_id,))
-    meds = [m["name"].lower() for m in cur.fetchall()]
-
-    if "bisoprolol" in meds and a["systolic_bp"] and a["systolic_bp"] < 95:
-        alerts.append(("Bisoprolol bei niedrigen RR mit Vorsicht verabreichen!", "warning"))
-
-    if "bisoprolol" in meds and a["heart_rate"] and a["heart_rate"] < 55:
-        alerts.append(("Bisoprolol bei niedrigen HF mit Vorsicht verabreichen!", "warning"))
-
-        # 4. ALLERGY / INTOLERANCE SYMPTOMS FROM NURSE NOTES
-        # -------------------------
-    cur.execute("""
+    # ----------------------------------------------------------
+    # 3. MEDICATION SAFETY / 4. ALLERGY SYMPTOMS FROM NURSE NOTES
+    # ----------------------------------------------------------
+    tuple_cur.execute("""
          SELECT note
          FROM nurse_notes
          WHERE patient_id = ?
-         ORDER BY datetime(created_at) DESC, id DESC
+         ORDER BY created_at DESC, id DESC
          LIMIT 5;
      """, (patient_id,))
-    recent_notes = " ".join([(r["note"] or "").lower() for r in cur.fetchall()])
+    # stream the cursor and stop at the first symptom hit instead of
+    # materializing and lower-casing all five notes up front
+    symptom_hit = False
+    for (note,) in tuple_cur:
+        if note and _ALLERGY_SYMPTOM_RE.search(note.lower()):
+            symptom_hit = True
+            break
+
+    systolic_bp = a["systolic_bp"]
+    heart_rate = a["heart_rate"]
+
+    # Only touch the medications table when some rule can use it: the
+    # beta-blocker rules fire on low BP/HR, the allergy alert on a
+    # symptom hit. The common no-hit case skips the query entirely.
+    med_names = []
+    if symptom_hit or (systolic_bp and systolic_bp < 95) or (heart_rate and heart_rate < 55):
+        tuple_cur.execute("""
+            SELECT name FROM medications
+            WHERE patient_id = ?;
+        """, (patient_id,))
+        med_names = [name for (name,) in tuple_cur.fetchall()]
+    meds = {name.lower() for name in med_names}
 
-    allergy_symptom_keywords = [
-        "juckreiz", "juckende haut", "haut juckt"]
+    # Example rule: hypotension + beta blocker
+    if "bisoprolol" in meds and systolic_bp and systolic_bp < 95:
+        alerts.append(("Bisoprolol bei niedrigen RR mit Vorsicht verabreichen!", "warning"))
+
+    if "bisoprolol" in meds and heart_rate and heart_rate < 55:
+        alerts.append(("Bisoprolol bei niedrigen HF mit Vorsicht verabreichen!", "warning"))
 
-    if any(k in recent_notes for k in allergy_symptom_keywords):
+    if symptom_hit:
         # Pull documented allergies from patient
         cur.execute("SELECT allergies FROM patients WHERE id = ?;", (patient_id,))
         row = cur.fetchone()
         allergies_text = (row["allergies"] or "").strip() if row else ""
 
-        # Pull currently ordered meds (helps the nurse "check meds")
-        cur.execute("SELECT name FROM medications WHERE patient_id = ?;", (patient_id,))
-        ordered_meds = ", ".join([m["name"] for m in cur.fetchall()]) or "—"
+        # Currently ordered meds (helps the nurse "check meds") — already loaded above
+        ordered_meds = ", ".join(med_names) or "—"
 
         alerts.append((
             f"Allergie-/Unverträglichkeitszeichen (z.B. Juckreiz/Ausschlag). "
@@ -237,19 +602,38 @@ def generate_ai_alerts(conn, patient_id):
         ))
 
     # -------------------------
-    # SAVE ALERTS (CLEAR OLD ALERTS)
+    # SAVE ALERTS (diff against the stored rows: only stale alerts are
+    # deleted and only new ones inserted, so an unchanged alert set
+    # writes nothing and surviving alerts keep their created_at)
     # -------------------------
-    cur.execute("DELETE FROM ai_alerts WHERE patient_id = ?", (patient_id,))
-
-    for text, severity in alerts:
-        cur.execute("""
+    tuple_cur.execute("""
+        SELECT alert, severity FROM ai_alerts
+        WHERE patient_id = ?;
+    """, (patient_id,))
+    old_alerts = set(tuple_cur.fetchall())
+    new_alerts = set(alerts)
+
+    if old_alerts != new_alerts:
+        _begin_immediate(conn)
+        cur.executemany("""
+            DELETE FROM ai_alerts
+            WHERE patient_id = ? AND alert = ? AND severity = ?;
+        """, [(patient_id, text, severity)
+              for text, severity in old_alerts - new_alerts])
+
+        created_at = now_local().isoformat(timespec="minutes")
+        chunked_executemany(cur, """
             INSERT INTO ai_alerts (patient_id, alert, severity, created_at)
             VALUES (?, ?, ?, ?);
-        """, (patient_id, text, severity, now_local().isoformat(timespec="minutes")))
+        """, [(patient_id, text, severity, created_at)
+              for text, severity in new_alerts - old_alerts],
+            params_per_row=4)
 
-    conn.commit()
+        conn.commit()
+    _ALERT_FINGERPRINTS[patient_id] = fingerprint
 
 
+@functools.lru_cache(maxsize=256)
 def get_default_interval_hours(description: str) -> int:
     """
     Very simple parser: look for 'alle Xh' in the description
@@ -257,42 +641,38 @@ def get_default_interval_hours(description: str) -> int:
     """
     desc = description.lower()
     if "täglich" in desc: return 24
-    if "alle 2h" in desc or "alle 2 h" in desc:
-        return 2
-    if "alle 4h" in desc or "alle 4 h" in desc:
-        return 4
-    if "alle 1h" in desc or "alle 1 h" in desc:
-        return 1
+    m = _EVERY_N_HOURS_RE.search(desc)
+    if m:
+        return int(m.group(1))
     # default if nothing specific
     return 4
 
 # ---------------------------------------------------------
 # Voice documentation phrase → task mapping
 # ---------------------------------------------------------
+_PHRASE_TASKS = {
+    "teilgewaschen": "Patient teilgewaschen",
+    "ganzgewaschen": "Patient ganzgewaschen",
+    "inhaliert": "Inhalation durchgeführt",
+    "urin geleert": "Urinflasche geleert",
+    "gelagert": "Lagerung alle 2h dokumentieren",
+    "mobilisiert": "Mobilisation nach Standard",
+    "zähne geputzt": "Zahnpflege durchgeführt",
+    "essen": "Beim Essen geholfen",
+    "aufgeklärt": "Patient informiert / aufgeklärt",
+    "op geprüft": "Post-operative Kontrolle durchgeführt",
+    "hochlagert": "Oberkörper-hoch-lagerung, atemerleichternde Positionierung",
+    "orientiert": "Orientierungs-hilfen (Kalender, Uhr, Angehörige) bereitstellen",
+    "wunde": "Wund-behandlung durchgeführt",
+}
+
+# One pass over the text instead of 13 sequential substring scans.
+_PHRASE_RE = re.compile("|".join(re.escape(k) for k in _PHRASE_TASKS))
+
+
 def map_selected_phrase_to_task(text: str) -> str | None:
-    t = text.lower()
-
-    mappings = {
-        "teilgewaschen": "Patient teilgewaschen",
-        "ganzgewaschen": "Patient ganzgewaschen",
-        "inhaliert": "Inhalation durchgeführt",
-        "urin geleert": "Urinflasche geleert",
-        "gelagert": "Lagerung alle 2h dokumentieren",
-        "mobilisiert" :"Mobilisation nach Standard",
-        "zähne geputzt": "Zahnpflege durchgeführt",
-        "essen": "Beim Essen geholfen",
-        "aufgeklärt": "Patient informiert / aufgeklärt",
-        "op geprüft": "Post-operative Kontrolle durchgeführt",
-        "hochlagert" : "Oberkörper-hoch-lagerung, atemerleichternde Positionierung",
-        "orientiert" : "Orientierungs-hilfen (Kalender, Uhr, Angehörige) bereitstellen",
-        "wunde" : "Wund-behandlung durchgeführt",
-    }
-
-    for key, task in mappings.items():
-        if key in t:
-            return task
-
-    return None
+    m = _PHRASE_RE.search(text.lower())
+    return _PHRASE_TASKS[m.group(0)] if m else None
 
 def extract_problems_from_nurse_notes(conn, patient_id: int) -> list[str]:
     """
@@ -305,7 +685,7 @@ def extract_problems_from_nurse_notes(conn, patient_id: int) -> list[str]:
         SELECT note
         FROM nurse_notes
         WHERE patient_id = ?
-        ORDER BY datetime(created_at) DESC, id DESC
+        ORDER BY created_at DESC, id DESC
         LIMIT 1;
     """, (patient_id,))
 
@@ -314,13 +694,13 @@ def extract_problems_from_nurse_notes(conn, patient_id: int) -> list[str]:
         return []
 
     note_text = row["note"].lower()
-    found_problems = []
-
-    for keyword, problem in SPOKEN_PRIORITY_KEYWORDS.items():
-        if keyword in note_text:
-            found_problems.append(problem)
+    found_problems = [
+        SPOKEN_PRIORITY_KEYWORDS[match]
+        for match in _SPOKEN_PRIORITY_RE.findall(note_text)
+    ]
 
-    return list(set(found_problems))  # avoid duplicates
+    # avoid duplicates, but keep the order the note mentioned them in
+    return list(dict.fromkeys(found_problems))
 
 PRIORITY_WEIGHTS = {
     # A / B
@@ -347,6 +727,24 @@ PRIORITY_WEIGHTS = {
     "Allgemeines Monitoring / Stabilisierung": 99,
 }
 
+# Assessment-driven nursing problems: (column, predicate, problem). Same
+# data-table shape as _VITAL_ALERT_RULES, so threshold changes live in
+# one list instead of an if-ladder. Predicates only see measured values;
+# 0 is a valid reading (e.g. mobility), so the None check stays outside.
+_PROBLEM_RULES = [
+    ("pain", lambda v: v >= 7, "Schmerzen"),
+    ("mobility", lambda v: v <= 3, "Sturz- und Dekubitusrisiko"),
+    ("confusion", lambda v: v >= 6, "Akute Verwirrtheit / Delirrisiko"),
+    ("oxygen_sat", lambda v: v < 92, "Hypoxie-Risiko / O₂-Überwachung"),
+    ("heart_rate", lambda v: v > 100, "Tachykardie / Kreislaufbelastung"),
+    ("heart_rate", lambda v: v < 60, "Bradykardie / Kreislauf instabil"),
+    ("systolic_bp", lambda v: v < 90, "Hypotonie – Kreislauf instabil"),
+    ("systolic_bp", lambda v: v > 175, "Hypertonie – Kreislauf instabil"),
+    ("systolic_bp", lambda v: v < 90, "Sturz- und Dekubitusrisiko"),
+    ("temperature", lambda v: v > 38.5, "Infektionsrisiko"),
+    ("respiration_rate", lambda v: v > 20, "Atemnot / eingeschränkter Gasaustausch"),
+]
+
 
 def generate_priorities_and_tasks(conn, patient_id: int) -> None:
     """
@@ -359,14 +757,7 @@ def generate_priorities_and_tasks(conn, patient_id: int) -> None:
     # -------------------------------------------------
     # Latest assessment (if exists)
     # -------------------------------------------------
-    cur.execute("""
-        SELECT *
-        FROM assessments
-        WHERE patient_id = ?
-        ORDER BY datetime(created_at) DESC, id DESC
-        LIMIT 1;
-    """, (patient_id,))
-    a = cur.fetchone()
+    a = get_latest_assessment(conn, patient_id)
 
     # -------------------------------------------------
     # Load existing priorities (accumulative model)
@@ -378,73 +769,28 @@ def generate_priorities_and_tasks(conn, patient_id: int) -> None:
         ORDER BY priority_rank;
     """, (patient_id,))
     problems = [r["problem"] for r in cur.fetchall()]
+    seen = set(problems)
+
+    def add_problem(problem):
+        # set-backed membership: the list check was O(n) per rule
+        if problem not in seen:
+            problems.append(problem)
+            seen.add(problem)
 
     # -------------------------------------------------
     # Add problems from spoken nurse notes
     # -------------------------------------------------
-    spoken_problems = extract_problems_from_nurse_notes(conn, patient_id)
-    for p in spoken_problems:
-        if p not in problems:
-            problems.append(p)
+    for p in extract_problems_from_nurse_notes(conn, patient_id):
+        add_problem(p)
 
     # -------------------------------------------------
     # Add problems from latest flowsheet (if available)
     # -------------------------------------------------
     if a:
-        # Pain
-        if a["pain"] is not None and a["pain"] >= 7:
-            if "Schmerzen" not in problems:
-                problems.append("Schmerzen")
-
-        # Mobility / fall risk
-        if a["mobility"] is not None and a["mobility"] <= 3:
-            if "Sturz- und Dekubitusrisiko" not in problems:
-                problems.append("Sturz- und Dekubitusrisiko")
-
-        # Confusion
-        if a["confusion"] is not None and a["confusion"] >= 6:
-            if "Akute Verwirrtheit / Delirrisiko" not in problems:
-                problems.append("Akute Verwirrtheit / Delirrisiko")
-
-        # Oxygen
-        if a["oxygen_sat"] is not None and a["oxygen_sat"] < 92:
-            if "Hypoxie-Risiko / O₂-Überwachung" not in problems:
-                problems.append("Hypoxie-Risiko / O₂-Überwachung")
-
-        # Heart rate
-        if a["heart_rate"] is not None and a["heart_rate"] > 100:
-            if "Tachykardie / Kreislaufbelastung" not in problems:
-                problems.append("Tachykardie / Kreislaufbelastung")
-
-        # Heart rate
-        if a["heart_rate"] is not None and a["heart_rate"] < 60:
-            if "Bradykardie / Kreislauf instabil" not in problems:
-                problems.append("Bradykardie / Kreislauf instabil")
-
-        # Blood pressure
-        if a["systolic_bp"] is not None and a["systolic_bp"] < 90:
-            if "Hypotonie – Kreislauf instabil" not in problems:
-                problems.append("Hypotonie – Kreislauf instabil")
-
-        # Blood pressure
-        if a["systolic_bp"] is not None and a["systolic_bp"] > 175:
-            if "Hypertonie – Kreislauf instabil" not in problems:
-                problems.append("Hypertonie – Kreislauf instabil")
-
-        # Blood pressure
-        if a["systolic_bp"] is not None and a["systolic_bp"] < 90:
-            if "Sturz- und Dekubitusrisiko" not in problems:
-                problems.append("Sturz- und Dekubitusrisiko")
-
-        # Temperature
-        if a["temperature"] is not None and a["temperature"] > 38.5:
-            if "Infektionsrisiko" not in problems:
-                problems.append("Infektionsrisiko")
-
-        # Breathing
-        if a["respiration_rate"] is not None and a["respiration_rate"] > 20:
-            if "Atemnot / eingeschränkter Gasaustausch" not in problems:
-                problems.append("Atemnot / eingeschränkter Gasaustausch")
+        for column, predicate, problem in _PROBLEM_RULES:
+            value = a[column]
+            if value is not None and predicate(value):
+                add_problem(problem)
 
     # -------------------------------------------------
     # Fallback (only if NOTHING exists)
@@ -455,23 +801,25 @@ def generate_priorities_and_tasks(conn, patient_id: int) -> None:
     # -------------------------------------------------
     # ABC PRIORITIZATION
     # -------------------------------------------------
-    problems = list(dict.fromkeys(problems))  # remove duplicates, keep order
     problems.sort(key=lambda p: PRIORITY_WEIGHTS.get(p, 50))
     problems = problems[:3]
 
     # -------------------------------------------------
     # Persist priorities
     # -------------------------------------------------
+    _begin_immediate(conn)
     cur.execute("DELETE FROM patient_priorities WHERE patient_id = ?;", (patient_id,))
-    for rank, prob in enumerate(problems, start=1):
-        cur.execute("""
-            INSERT INTO patient_priorities (patient_id, priority_rank, problem)
-            VALUES (?, ?, ?);
-        """, (patient_id, rank, prob))
+    cur.executemany("""
+        INSERT INTO patient_priorities (patient_id, priority_rank, problem)
+        VALUES (?, ?, ?);
+    """, [(patient_id, rank, prob) for rank, prob in enumerate(problems, start=1)])
 
     # -------------------------------------------------
     # Generate tasks (idempotent)
     # -------------------------------------------------
+    now = now_local()
+    due_by_hours = {}  # interval → ISO due string, shared across tasks
+    task_rows = []
     for prob in problems:
         if "Hypoxie" in prob or "Atemnot" in prob:
             task_descriptions = [
@@ -502,21 +850,20 @@ def generate_priorities_and_tasks(conn, patient_id: int) -> None:
 
         for desc in task_descriptions:
             interval_hours = get_default_interval_hours(desc)
-            next_due = now_local() + timedelta(hours=interval_hours)
-            next_due_str = next_due.isoformat(timespec="minutes")
-
-            # prevent duplicates
-            cur.execute("""
-                DELETE FROM ai_tasks
-                WHERE patient_id = ?
-                  AND completed = 0
-                  AND description = ?;
-            """, (patient_id, desc))
-
-            cur.execute("""
-                INSERT INTO ai_tasks (patient_id, description, due_time, completed)
-                VALUES (?, ?, ?, 0);
-            """, (patient_id, desc, next_due_str))
+            due = due_by_hours.get(interval_hours)
+            if due is None:
+                due = (now + timedelta(hours=interval_hours)).isoformat(timespec="minutes")
+                due_by_hours[interval_hours] = due
+            task_rows.append((patient_id, desc, due, _TASK_CATEGORIES.get(desc)))
+
+    # one open task per (patient, description): the partial unique
+    # index turns the old DELETE+INSERT dedup into an atomic upsert
+    cur.executemany("""
+        INSERT INTO ai_tasks (patient_id, description, due_time, completed, category)
+        VALUES (?, ?, ?, 0, ?)
+        ON CONFLICT(patient_id, description) WHERE completed = 0
+        DO UPDATE SET due_time = excluded.due_time;
+    """, task_rows)
 
     generate_ai_alerts(conn, patient_id)
     conn.commit()
@@ -543,6 +890,13 @@ SPOKEN_PRIORITY_KEYWORDS = {
     "delir": "Akute Verwirrtheit / Delirrisiko",
 }
 
+# Compiled union of the spoken triggers: one scan over the note instead
+# of a substring search per keyword. Longest keys first so overlapping
+# triggers ("fast gefallen" vs "gefallen") resolve to the longer match.
+_SPOKEN_PRIORITY_RE = re.compile("|".join(
+    re.escape(k) for k in sorted(SPOKEN_PRIORITY_KEYWORDS, key=len, reverse=True)
+))
+
 def complete_and_schedule_next(conn, patient_id: int, desc_exact: str, interval_hours: int):
     """
     Completes the open task with description == desc_exact, then inserts the next occurrence.
@@ -556,7 +910,7 @@ def complete_and_schedule_next(conn, patient_id: int, desc_exact: str, interval_
         WHERE patient_id = ?
           AND description = ?
           AND completed = 0
-        ORDER BY datetime(due_time) ASC
+        ORDER BY due_time ASC
         LIMIT 1;
     """, (patient_id, desc_exact))
     row = cur.fetchone()
@@ -575,9 +929,10 @@ def complete_and_schedule_next(conn, patient_id: int, desc_exact: str, interval_
     # schedule next
     next_due = now_local() + timedelta(hours=interval_hours)
     cur.execute("""
-        INSERT INTO ai_tasks (patient_id, description, due_time, completed)
-        VALUES (?, ?, ?, 0);
-    """, (patient_id, desc_exact, next_due.isoformat(timespec="minutes")))
+        INSERT INTO ai_tasks (patient_id, description, due_time, completed, category)
+        VALUES (?, ?, ?, 0, ?);
+    """, (patient_id, desc_exact, next_due.isoformat(timespec="minutes"),
+          _TASK_CATEGORIES.get(desc_exact)))
 
 
 def update_bezugspflege_by_interactions(conn, patient_id: int) -> None:
@@ -589,74 +944,54 @@ def update_bezugspflege_by_interactions(conn, patient_id: int) -> None:
       - med_administrations.nurse_id (id)
     """
 
-    conn.row_factory = sqlite3.Row
     cur = conn.cursor()
 
-    # --- Get nurses map: name -> id (so we can convert author strings to nurse_id) ---
-    cur.execute("SELECT id, name FROM nurses;")
-    nurses = cur.fetchall()
-    name_to_id = {n["name"]: n["id"] for n in nurses}
-
-    scores: dict[int, int] = {}
-
-    def add_score(nurse_id: int | None, points: int):
-        if not nurse_id:
-            return
-        scores[nurse_id] = scores.get(nurse_id, 0) + points
-
-    # --- Nurse notes (author is a name string) ---
-    cur.execute("""
-        SELECT author, COUNT(*) AS c
-        FROM nurse_notes
-        WHERE patient_id = ?
-        GROUP BY author;
-    """, (patient_id,))
-    for r in cur.fetchall():
-        nurse_id = name_to_id.get((r["author"] or "").strip())
-        add_score(nurse_id, points=2 * int(r["c"] or 0))
-
-    # --- Assessments (author is a name string) ---
-    cur.execute("""
-        SELECT author, COUNT(*) AS c
-        FROM assessments
-        WHERE patient_id = ?
-        GROUP BY author;
-    """, (patient_id,))
-    for r in cur.fetchall():
-        nurse_id = name_to_id.get((r["author"] or "").strip())
-        add_score(nurse_id, points=1 * int(r["c"] or 0))
+    cur.execute("SELECT bezugspflege_id FROM patients WHERE id = ?;", (patient_id,))
+    row = cur.fetchone()
+    if row is None:
+        return
+    current_id = row["bezugspflege_id"]
 
-    # --- Med administrations (already has nurse_id) ---
+    # One aggregated query: the three weighted counts are summed per
+    # nurse in SQL (notes ×2, assessments ×1, med administrations ×1)
+    # and the winner picked by ORDER BY, with ties broken in favour of
+    # the current Bezugspflege so the assignment stays sticky.
     cur.execute("""
-        SELECT nurse_id, COUNT(*) AS c
-        FROM med_administrations
-        WHERE patient_id = ?
-        GROUP BY nurse_id;
-    """, (patient_id,))
-    for r in cur.fetchall():
-        add_score(r["nurse_id"], points=1 * int(r["c"] or 0))
+        WITH scored(nurse_id, s) AS (
+            SELECT n.id, 2 * COUNT(*)
+            FROM nurse_notes nn
+            JOIN nurses n ON n.name = trim(nn.author)
+            WHERE nn.patient_id = :pid
+            GROUP BY n.id
+            UNION ALL
+            SELECT n.id, COUNT(*)
+            FROM assessments a
+            JOIN nurses n ON n.name = trim(a.author)
+            WHERE a.patient_id = :pid
+            GROUP BY n.id
+            UNION ALL
+            SELECT nurse_id, COUNT(*)
+            FROM med_administrations
+            WHERE patient_id = :pid AND nurse_id IS NOT NULL
+            GROUP BY nurse_id
+        )
+        SELECT nurse_id
+        FROM scored
+        GROUP BY nurse_id
+        ORDER BY SUM(s) DESC, (nurse_id = :current) DESC, nurse_id
+        LIMIT 1;
+    """, {"pid": patient_id, "current": current_id})
+    winner = cur.fetchone()
 
-    if not scores:
+    if winner is None:
         return  # nobody documented yet → don't change anything
 
-    # Winner = highest score; tie-breaker = keep current bezugspflege if tied
-    cur.execute("SELECT bezugspflege_id FROM patients WHERE id = ?;", (patient_id,))
-    current_id = cur.fetchone()["bezugspflege_id"]
-
-    best_score = max(scores.values())
-    winners = [nid for nid, sc in scores.items() if sc == best_score]
-
-    if current_id in winners:
-        chosen = current_id
-    else:
-        chosen = winners[0]
-
-    # Update patient
+    _begin_immediate(conn)
     cur.execute("""
         UPDATE patients
         SET bezugspflege_id = ?
         WHERE id = ?;
-    """, (chosen, patient_id))
+    """, (winner["nurse_id"], patient_id))
 
     conn.commit()
 
@@ -667,9 +1002,6 @@ def ensure_standard_vitals_tasks(conn):
     """
     cur = conn.cursor()
 
-    cur.execute("SELECT id FROM patients;")
-    patient_ids = [r["id"] for r in cur.fetchall()]
-
     due = (now_local() + timedelta(hours=0)).isoformat(timespec="minutes")
 
     standard_tasks = [
@@ -678,202 +1010,241 @@ def ensure_standard_vitals_tasks(conn):
         "Gewicht täglich messen",
     ]
 
-    for pid in patient_ids:
-        for desc in standard_tasks:
-            cur.execute("""
-                SELECT 1
-                FROM ai_tasks
-                WHERE patient_id = ?
-                  AND description = ?
-                  AND completed = 0
-                LIMIT 1;
-            """, (pid, desc))
-            exists = cur.fetchone()
-
-            if not exists:
-                cur.execute("""
-                    INSERT INTO ai_tasks (patient_id, description, due_time, completed)
-                    VALUES (?, ?, ?, 0);
-                """, (pid, desc, due))
+    # One set-based INSERT..SELECT per standard task instead of a
+    # SELECT + INSERT pair per (patient × task); the NOT EXISTS probe
+    # rides the open-tasks partial index.
+    _begin_immediate(conn)
+    cur.executemany("""
+        INSERT INTO ai_tasks (patient_id, description, due_time, completed, category)
+        SELECT p.id, ?, ?, 0, ?
+        FROM patients p
+        WHERE NOT EXISTS (
+            SELECT 1
+            FROM ai_tasks t
+            WHERE t.patient_id = p.id
+              AND t.description = ?
+              AND t.completed = 0
+        );
+    """, [(desc, due, _TASK_CATEGORIES.get(desc), desc) for desc in standard_tasks])
 
     conn.commit()
 
+# ---------------------------------------------------------
+# Background recomputation of derived tables
+# ---------------------------------------------------------
+# A flowsheet submission only needs the assessment row and the task
+# completions committed before it redirects; the Bezugspflege score and
+# the priority/alert rebuild are derived data. One daemon worker takes
+# that work off the request path, and the pending set coalesces bursts
+# of submissions for the same patient into a single recompute.
+_recompute_queue = queue.Queue()
+_recompute_pending = set()
+_recompute_lock = threading.Lock()
+
+
+def schedule_recompute(patient_id):
+    with _recompute_lock:
+        if patient_id in _recompute_pending:
+            return
+        _recompute_pending.add(patient_id)
+    _recompute_queue.put(patient_id)
+
+
+def _recompute_worker():
+    while True:
+        patient_id = _recompute_queue.get()
+        with _recompute_lock:
+            _recompute_pending.discard(patient_id)
+        try:
+            # app context so the generators' g-scoped caches work
+            with app.app_context(), get_connection(write=True) as conn:
+                update_bezugspflege_by_interactions(conn, patient_id)
+                generate_priorities_and_tasks(conn, patient_id)
+        except Exception:
+            app.logger.exception("recompute failed for patient %s", patient_id)
+        finally:
+            _recompute_queue.task_done()
+
+
+threading.Thread(target=_recompute_worker, name="derived-recompute",
+                 daemon=True).start()
+
+
 # ---------------------------------------------------------
 # FLOWSHEET – assessment + last 5 assessments
 # ---------------------------------------------------------
+# Numeric flowsheet fields: (field, converter, min, max). One module-level
+# table replaces the to_int/to_float/safe_range closures that were
+# re-created on every POST; the 0-10 scales are stored unclamped.
+_VITALS_SPEC = [
+    ("temperature", float, 25, 45),
+    ("heart_rate", int, 0, 250),
+    ("respiration_rate", int, 0, 80),
+    ("systolic_bp", int, 40, 250),
+    ("diastolic_bp", int, 20, 150),
+    ("oxygen_sat", int, 50, 100),
+    ("weight", int, 50, 100),
+    ("pain", int, None, None),
+    ("mobility", int, None, None),
+    ("edema", int, None, None),
+    ("confusion", int, None, None),
+    ("nutrition", int, None, None),
+]
+
+
+def parse_vitals(form):
+    """One pass over the POSTed flowsheet numbers: convert and clamp."""
+    values = {}
+    for field, convert, min_v, max_v in _VITALS_SPEC:
+        raw = form.get(field)
+        if raw in (None, ""):
+            values[field] = None
+        else:
+            value = convert(raw)
+            if min_v is not None:
+                value = max(min_v, min(max_v, value))
+            values[field] = value
+    return values
+
+
+
 @app.route("/patient/<int:patient_id>/flowsheet", methods=["GET", "POST"])
 def flowsheet(patient_id):
-    conn = get_connection()
-    cur = conn.cursor()
+    with get_connection(write=request.method == "POST") as conn:
+        cur = conn.cursor()
 
-    if request.method == "POST":
-        def to_int(name):
-            v = request.form.get(name)
-            return int(v) if v not in (None, "",) else None
-
-        def to_float(name):
-            v = request.form.get(name)
-            return float(v) if v not in (None, "",) else None
-
-        def safe_range(value, min_v, max_v):
-            if value is None:
-                return None
-            return max(min_v, min(max_v, value))
-
-        # Vitals
-        temperature = to_float("temperature")
-        heart_rate = to_int("heart_rate")
-        respiration_rate = to_int("respiration_rate")
-        systolic_bp = to_int("systolic_bp")
-        diastolic_bp = to_int("diastolic_bp")
-        oxygen_sat = to_int("oxygen_sat")
-        weight = to_int("weight")
-
-        temperature = safe_range(temperature, 25, 45)
-        heart_rate = safe_range(heart_rate, 0, 250)
-        respiration_rate = safe_range(respiration_rate, 0, 80)
-        systolic_bp = safe_range(systolic_bp, 40, 250)
-        diastolic_bp = safe_range(diastolic_bp, 20, 150)
-        oxygen_sat = safe_range(oxygen_sat, 50, 100)
-        weight = safe_range(weight, 50, 100)
-
-
-        # Scales
-        pain = to_int("pain")
-        mobility = to_int("mobility")
-        edema = to_int("edema")
-        confusion = to_int("confusion")
-        nutrition = to_int("nutrition")
-
-        # Body systems notes
-        skin = request.form.get("skin") or ""
-        cardiac = request.form.get("cardiac") or ""
-        respiratory = request.form.get("respiratory") or ""
-        endocrine = request.form.get("endocrine") or ""
-        lymphatic = request.form.get("lymphatic") or ""
-        musculoskeletal = request.form.get("musculoskeletal") or ""
-        neuro = request.form.get("neuro") or ""
-        gastro = request.form.get("gastro") or ""
-        notes = request.form.get("other_notes") or ""
+        if request.method == "POST":
+            vitals = parse_vitals(request.form)
+
+            temperature = vitals["temperature"]
+            heart_rate = vitals["heart_rate"]
+            respiration_rate = vitals["respiration_rate"]
+            systolic_bp = vitals["systolic_bp"]
+            diastolic_bp = vitals["diastolic_bp"]
+            oxygen_sat = vitals["oxygen_sat"]
+            weight = vitals["weight"]
+
+            # Scales
+            pain = vitals["pain"]
+            mobility = vitals["mobility"]
+            edema = vitals["edema"]
+            confusion = vitals["confusion"]
+            nutrition = vitals["nutrition"]
+
+            # Body systems notes
+            skin = request.form.get("skin") or ""
+            cardiac = request.form.get("cardiac") or ""
+            respiratory = request.form.get("respiratory") or ""
+            endocrine = request.form.get("endocrine") or ""
+            lymphatic = request.form.get("lymphatic") or ""
+            musculoskeletal = request.form.get("musculoskeletal") or ""
+            neuro = request.form.get("neuro") or ""
+            gastro = request.form.get("gastro") or ""
+            notes = request.form.get("other_notes") or ""
 
 
 
-        cur.execute("""
-            INSERT INTO assessments (
-                patient_id, created_at, author,
+            cur.execute("""
+                INSERT INTO assessments (
+                    patient_id, created_at, author,
+                    temperature, heart_rate, respiration_rate,
+                    systolic_bp, diastolic_bp, oxygen_sat,
+                    pain, weight, mobility, edema, confusion, nutrition,
+                    skin, cardiac, respiratory, endocrine, lymphatic,
+                    musculoskeletal, neuro, gastro, other_notes
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (
+                patient_id, now_local().isoformat(timespec="minutes"),
+                get_current_nurse(conn)["name"] if get_current_nurse(conn) else "unbekannt",
                 temperature, heart_rate, respiration_rate,
-                systolic_bp, diastolic_bp, oxygen_sat,
+                systolic_bp, diastolic_bp,oxygen_sat,
                 pain, weight, mobility, edema, confusion, nutrition,
                 skin, cardiac, respiratory, endocrine, lymphatic,
-                musculoskeletal, neuro, gastro, other_notes
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            patient_id, now_local().isoformat(timespec="minutes"),
-            get_current_nurse(conn)["name"] if get_current_nurse(conn) else "unbekannt",
-            temperature, heart_rate, respiration_rate,
-            systolic_bp, diastolic_bp,oxygen_sat,
-            pain, weight, mobility, edema, confusion, nutrition,
-            skin, cardiac, respiratory, endocrine, lymphatic,
-            musculoskeletal, neuro, gastro, notes
-        ))
+                musculoskeletal, neuro, gastro, notes
+            ))
 
-        # ----------------------------
-        # Mark tasks completed ONLY if the matching field was charted
-        # (use exact descriptions to avoid accidental matches)
-        # ----------------------------
+            # ----------------------------
+            # Mark tasks completed ONLY if the matching field was charted
+            # (use exact descriptions to avoid accidental matches)
+            # ----------------------------
 
-        charted_weight = (weight is not None)
-        charted_pain = (pain is not None)
+            charted_weight = (weight is not None)
+            charted_pain = (pain is not None)
 
-        def is_filled(x):
-            return x is not None and str(x).strip() != ""
+            def is_filled(x):
+                return x is not None and str(x).strip() != ""
 
-        charted_any_vitals = any(is_filled(v) for v in [
-            temperature, heart_rate, respiration_rate,
-            systolic_bp, diastolic_bp, oxygen_sat
-        ])
+            charted_any_vitals = any(is_filled(v) for v in [
+                temperature, heart_rate, respiration_rate,
+                systolic_bp, diastolic_bp, oxygen_sat
+            ])
 
-        if charted_any_vitals:
-            cur.execute("""
-                UPDATE ai_tasks
-                SET completed = 1
-                WHERE patient_id = ?
-                  AND completed = 0
-                  AND (
-                      description LIKE '%Vitalzeichen%'
-                      OR description LIKE '%RR%'
-                      OR description LIKE '%SpO2%'
-                      OR description LIKE '%Puls%'
-                      OR description LIKE '%AF%'
-                  );
-            """, (patient_id,))
+            if charted_any_vitals:
+                cur.execute("""
+                    UPDATE ai_tasks
+                    SET completed = 1
+                    WHERE patient_id = ?
+                      AND completed = 0
+                      AND category = 'vitals';
+                """, (patient_id,))
 
-        if charted_pain:
-            complete_and_schedule_next(conn, patient_id, "Schmerzen täglich nachfragen", 24)
+            if charted_pain:
+                complete_and_schedule_next(conn, patient_id, "Schmerzen täglich nachfragen", 24)
 
-        if charted_weight:
-            complete_and_schedule_next(conn, patient_id, "Gewicht täglich messen", 24)
+            if charted_weight:
+                complete_and_schedule_next(conn, patient_id, "Gewicht täglich messen", 24)
 
-        conn.commit()
+            conn.commit()
 
-        # 🔴 Write wichtige Beobachtungen auch als pflegerische Notiz
-        # write important flowsheet notes into nurse_notes
-        if notes and notes.strip():
-            current_nurse = get_current_nurse(conn)
-            author = current_nurse["name"] if current_nurse else "Flowsheet-Dokumentation"
+            # 🔴 Write wichtige Beobachtungen auch als pflegerische Notiz
+            # write important flowsheet notes into nurse_notes
+            if notes and notes.strip():
+                current_nurse = get_current_nurse(conn)
+                author = current_nurse["name"] if current_nurse else "Flowsheet-Dokumentation"
 
-            cur.execute("""
-                INSERT INTO nurse_notes (patient_id, note, created_at, author)
-                VALUES (?, ?, ?, ?);
-            """, (
-                patient_id,
-                notes.strip(),
-                now_local().isoformat(timespec="minutes"),
-                author
-            ))
+                cur.execute("""
+                    INSERT INTO nurse_notes (patient_id, note, created_at, author)
+                    VALUES (?, ?, ?, ?);
+                """, (
+                    patient_id,
+                    notes.strip(),
+                    now_local().isoformat(timespec="minutes"),
+                    author
+                ))
 
-        conn.commit()
-        update_bezugspflege_by_interactions(conn, patient_id)
-        generate_priorities_and_tasks(conn, patient_id)
-        conn.close()
-        return redirect(url_for("flowsheet", patient_id=patient_id))
+            conn.commit()
+            schedule_recompute(patient_id)
+            return redirect(url_for("flowsheet", patient_id=patient_id))
 
-    # GET: patient + last 5 assessments
-    cur.execute("SELECT * FROM patients WHERE id = ?;", (patient_id,))
-    patient = cur.fetchone()
+        # GET: patient + last 5 assessments
+        cur.execute("SELECT * FROM patients WHERE id = ?;", (patient_id,))
+        patient = cur.fetchone()
 
-    cur.execute("""
-            SELECT alert, severity, created_at
-            FROM ai_alerts
+        cur.execute(SQL_ALERTS_BY_PID, (patient_id,))
+        alerts = cur.fetchall()
+
+        cur.execute("""
+            SELECT *
+            FROM assessments
             WHERE patient_id = ?
-            ORDER BY datetime(created_at) DESC, id DESC; 
+            ORDER BY created_at DESC, id DESC
+            LIMIT 5;
         """, (patient_id,))
-    alerts = cur.fetchall()
-
-    cur.execute("""
-        SELECT *
-        FROM assessments
-        WHERE patient_id = ?
-        ORDER BY datetime(created_at) DESC, id DESC
-        LIMIT 5;
-    """, (patient_id,))
-    recent_assessments = cur.fetchall()
+        recent_assessments = cur.fetchall()
 
-    if patient:
-        add_patient_tab(patient["id"], patient["name"], url_for("flowsheet", patient_id=patient["id"]))
-        set_active_patient(patient["id"])
+        if patient:
+            open_patient_tab(patient["id"], patient["name"], url_for("flowsheet", patient_id=patient["id"]))
 
-    current_nurse = get_current_nurse(conn)
-    conn.close()
+        current_nurse = get_current_nurse(conn)
 
-    return render_template(
-        "flowsheet.html",
-        alerts=alerts,
-        patient=patient,
-        recent_assessments=recent_assessments,
-        current_nurse=current_nurse,
-        active_tab="flowsheet",
-    )
+        return render_template(
+            "flowsheet.html",
+            alerts=alerts,
+            patient=patient,
+            recent_assessments=recent_assessments,
+            current_nurse=current_nurse,
+            active_tab="flowsheet",
+        )
 
 
 # ---------------------------------------------------------
@@ -884,51 +1255,50 @@ def home():
     if "current_nurse_id" not in session:
         return redirect(url_for("select_nurse"))
 
-    conn = get_connection()
-    ensure_standard_vitals_tasks(conn)
-    cur = conn.cursor()
+    with get_connection(write=True) as conn:
+        ensure_standard_vitals_tasks(conn)
+        cur = conn.cursor()
 
-    cur.execute("""
-        SELECT 
-            p.id,
-            p.patient_identifier,
-            p.name,
-            p.room,
-            p.gender,
-            p.dob,
-            p.diagnosis,
-            p.allergies,
-            p.code_status,
-            p.admission_date,
-            p.expected_discharge,
-            p.primary_doctor,
-            p.photo_filename,
-            n.name AS bezugspflege_name
-        FROM patients p
-        LEFT JOIN nurses n ON p.bezugspflege_id = n.id
-        ORDER BY p.room;
-    """)
-    patients = cur.fetchall()
+        cur.execute("""
+            SELECT 
+                p.id,
+                p.patient_identifier,
+                p.name,
+                p.room,
+                p.gender,
+                p.dob,
+                p.diagnosis,
+                p.allergies,
+                p.code_status,
+                p.admission_date,
+                p.expected_discharge,
+                p.primary_doctor,
+                p.photo_filename,
+                n.name AS bezugspflege_name,
+                (SELECT group_concat(problem, char(31))
+                 FROM (SELECT problem
+                       FROM patient_priorities pp
+                       WHERE pp.patient_id = p.id
+                       ORDER BY pp.priority_rank)) AS priorities_concat
+            FROM patients p
+            LEFT JOIN nurses n ON p.bezugspflege_id = n.id
+            ORDER BY p.room;
+        """)
+        patients = cur.fetchall()
 
-    # Load AI priorities
-    cur.execute("""
-        SELECT patient_id, priority_rank, problem
-        FROM patient_priorities
-        ORDER BY patient_id, priority_rank;
-    """)
-    rows = cur.fetchall()
-    priorities = {}
-    for r in rows:
-        priorities.setdefault(r["patient_id"], []).append(r["problem"])
+        # AI priorities ride along on the patient rows, pre-aggregated
+        # by SQLite (unit separator as delimiter — problems are free text)
+        priorities = {
+            p["id"]: p["priorities_concat"].split("\x1f")
+            for p in patients if p["priorities_concat"]
+        }
 
-    current_nurse = get_current_nurse(conn)
-    conn.close()
+        current_nurse = get_current_nurse(conn)
 
-    conn.close()
-    return render_template("home.html",
-                           patients=patients,
-                           current_nurse=current_nurse,
-                           priorities=priorities)
+        return render_template("home.html",
+                               patients=patients,
+                               current_nurse=current_nurse,
+                               priorities=priorities)
 
 
 # ---------------------------------------------------------
@@ -936,99 +1306,93 @@ def home():
 # ---------------------------------------------------------
 @app.route("/patient/<int:patient_id>", methods=["GET", "POST"])
 def patient_detail(patient_id):
-    conn = get_connection()
-    cur = conn.cursor()
+    with get_connection() as conn:
+        cur = conn.cursor()
 
-    
 
-    cur.execute("""
-        SELECT 
-            p.id,
-            p.patient_identifier,
-            p.name,
-            p.gender,
-            p.dob,
-            p.diagnosis,
-            p.bezugspflege_id,
-            p.allergies,
-            p.code_status,
-            p.admission_date,
-            p.expected_discharge,
-            p.primary_doctor,
-            p.photo_filename,
-            n.name AS bezugspflege_name
-        FROM patients p
-        LEFT JOIN nurses n ON p.bezugspflege_id = n.id
-        WHERE p.id = ?;
-    """, (patient_id,))
-    patient = cur.fetchone()
 
-    cur.execute("SELECT id, name FROM nurses ORDER BY name;")
-    nurses = cur.fetchall()
+        cur.execute("""
+            SELECT 
+                p.id,
+                p.patient_identifier,
+                p.name,
+                p.gender,
+                p.dob,
+                p.diagnosis,
+                p.bezugspflege_id,
+                p.allergies,
+                p.code_status,
+                p.admission_date,
+                p.expected_discharge,
+                p.primary_doctor,
+                p.photo_filename,
+                n.name AS bezugspflege_name
+            FROM patients p
+            LEFT JOIN nurses n ON p.bezugspflege_id = n.id
+            WHERE p.id = ?;
+        """, (patient_id,))
+        patient = cur.fetchone()
 
-    cur.execute("""
-        SELECT id, name, dose, route, schedule
-        FROM medications
-        WHERE patient_id = ?
-            AND (given IS NULL OR given = 0)
-            AND (not_given IS NULL OR not_given = 0)
-        ORDER BY name;
-    """, (patient_id,))
-    meds = cur.fetchall()
+        cur.execute("SELECT id, name FROM nurses ORDER BY name;")
+        nurses = cur.fetchall()
 
-    cur.execute("""
-        SELECT description, due_date, status, ordered_by, type
-        FROM orders
-        WHERE patient_id = ?
-        ORDER BY due_date;
-    """, (patient_id,))
-    orders = cur.fetchall()
+        cur.execute("""
+            SELECT id, name, dose, route, schedule
+            FROM medications
+            WHERE patient_id = ?
+                AND (given IS NULL OR given = 0)
+                AND (not_given IS NULL OR not_given = 0)
+            ORDER BY name;
+        """, (patient_id,))
+        meds = cur.fetchall()
 
-    cur.execute("""
-        SELECT note, created_at, author
-        FROM doctor_notes
-        WHERE patient_id = ?
-        ORDER BY created_at DESC, id DESC;
-    """, (patient_id,))
-    doctor_notes = cur.fetchall()
+        cur.execute("""
+            SELECT description, due_date, status, ordered_by, type
+            FROM orders
+            WHERE patient_id = ?
+            ORDER BY due_date;
+        """, (patient_id,))
+        orders = cur.fetchall()
 
-    cur.execute("""
-        SELECT note, created_at, author
-        FROM nurse_notes
-        WHERE patient_id = ?
-        ORDER BY created_at DESC, id DESC;
-    """, (patient_id,))
-    nurse_notes = cur.fetchall()
+        cur.execute("""
+            SELECT note, created_at, author
+            FROM doctor_notes
+            WHERE patient_id = ?
+            ORDER BY created_at DESC, id DESC
+            LIMIT 50;
+        """, (patient_id,))
+        doctor_notes = cur.fetchall()
 
-    if patient:
-        add_patient_tab(patient["id"], patient["name"], url_for("patient_detail", patient_id=patient["id"]))
-        set_active_patient(patient["id"])
+        cur.execute("""
+            SELECT note, created_at, author
+            FROM nurse_notes
+            WHERE patient_id = ?
+            ORDER BY created_at DESC, id DESC
+            LIMIT 50;
+        """, (patient_id,))
+        nurse_notes = cur.fetchall()
 
-    cur.execute("""
-        SELECT alert, severity, created_at
-        FROM ai_alerts
-        WHERE patient_id = ?
-        ORDER BY datetime(created_at) DESC, id DESC;
-    """, (patient_id,))
-    alerts = cur.fetchall()
+        if patient:
+            open_patient_tab(patient["id"], patient["name"], url_for("patient_detail", patient_id=patient["id"]))
+
+        cur.execute(SQL_ALERTS_BY_PID, (patient_id,))
+        alerts = cur.fetchall()
 
-    current_nurse = get_current_nurse(conn)
-    conn.close()
+        current_nurse = get_current_nurse(conn)
 
-    conn.close()
 
-    return render_template(
-        "patient_detail.html",
-        alerts=alerts,
-        current_nurse=current_nurse,
-        patient=patient,
-        nurses=nurses,
-        meds=meds,
-        orders=orders,
-        doctor_notes=doctor_notes,
-        nurse_notes=nurse_notes,
-        active_tab="overview",
-    )
+        return render_template(
+            "patient_detail.html",
+            alerts=alerts,
+            current_nurse=current_nurse,
+            patient=patient,
+            nurses=nurses,
+            meds=meds,
+            orders=orders,
+            doctor_notes=doctor_notes,
+            nurse_notes=nurse_notes,
+            active_tab="overview",
+        )
 
 
 # ---------------------------------------------------------
@@ -1038,39 +1402,34 @@ def patient_detail(patient_id):
 def tasks_view():
     patient_id = request.args.get("patient_id", type=int)
 
-    conn = get_connection()
-    cur = conn.cursor()
+    with get_connection() as conn:
+        cur = conn.cursor()
 
-    # For the header (all vs single patient)
-    if patient_id:
-        cur.execute("""
-            SELECT id, name, patient_identifier
-            FROM patients
-            WHERE id = ?;
-        """, (patient_id,))
-        patients = cur.fetchall()
-        viewing_all_patients = False
-        selected_patient = patients[0] if patients else None
-    else:
-        cur.execute("""
-            SELECT id, name, patient_identifier
-            FROM patients
-            ORDER BY room;
-        """)
-        patients = cur.fetchall()
+        # For the header (all vs single patient). The single-patient
+        # row doubles as the header list, so the old second lookup of
+        # the same patient is gone.
+        if patient_id:
+            cur.execute("SELECT * FROM patients WHERE id = ?;", (patient_id,))
+            patient = cur.fetchone()
+            patients = [patient] if patient else []
+            viewing_all_patients = False
+            selected_patient = patient
+        else:
+            cur.execute(SQL_PATIENT_LIST)
+            patients = cur.fetchall()
 
-        viewing_all_patients = True
-        selected_patient = None
-        patient = None
+            viewing_all_patients = True
+            selected_patient = None
+            patient = None
 
-    if patient_id:
-        cur.execute("SELECT * FROM patients WHERE id = ?;", (patient_id,))
-        patient = cur.fetchone()
+        # The three task lists share one query shape each: the
+        # (:pid IS NULL OR ...) filter folds the all-patients and
+        # single-patient branches, and for a single patient the extra
+        # leading sort keys are constant so the ordering is unchanged.
 
-    # ---------- AI tasks ----------
-    if patient_id:
+        # ---------- AI tasks ----------
         cur.execute("""
-            SELECT 
+            SELECT
                 t.id,
                 t.patient_id,
                 t.description,
@@ -1080,252 +1439,193 @@ def tasks_view():
                 p.patient_identifier AS patient_identifier
             FROM ai_tasks t
             JOIN patients p ON p.id = t.patient_id
-            WHERE t.patient_id = ?
-            ORDER BY datetime(t.due_time);
-        """, (patient_id,))
-    else:
-        cur.execute("""
-            SELECT 
-                t.id,
-                t.patient_id,
-                t.description,
-                t.due_time,
-                t.completed,
-                p.name AS patient_name,
-                p.patient_identifier AS patient_identifier
-            FROM ai_tasks t
-            JOIN patients p ON p.id = t.patient_id
-            ORDER BY p.room, datetime(t.due_time);
-        """)
-    ai_tasks = cur.fetchall()
-
-    ai_tasks_open = [t for t in ai_tasks if not t["completed"]]
-    ai_tasks_done = [t for t in ai_tasks if t["completed"]]
-
-    # ---------- Orders ----------
-    if patient_id:
-        cur.execute("""
-            SELECT o.*, p.name AS patient_name, p.patient_identifier
-            FROM orders o
-            JOIN patients p ON p.id = o.patient_id
-            WHERE o.patient_id = ?
-            ORDER BY o.due_date;
-        """, (patient_id,))
-    else:
+            WHERE (:pid IS NULL OR t.patient_id = :pid)
+            ORDER BY p.room, t.due_time;
+        """, {"pid": patient_id})
+        # one pass per list instead of a comprehension per half
+        ai_tasks_open, ai_tasks_done = [], []
+        for t in cur:
+            (ai_tasks_done if t["completed"] else ai_tasks_open).append(t)
+
+        # ---------- Orders ----------
         cur.execute("""
             SELECT o.*, p.name AS patient_name, p.patient_identifier
             FROM orders o
             JOIN patients p ON p.id = o.patient_id
+            WHERE (:pid IS NULL OR o.patient_id = :pid)
             ORDER BY o.patient_id, o.due_date;
-        """)
-    orders = cur.fetchall()
-
-    orders_open = [o for o in orders if (o["status"] or "").lower() != "erledigt"]
-    orders_done = [o for o in orders if (o["status"] or "").lower() == "erledigt"]
+        """, {"pid": patient_id})
+        orders_open, orders_done = [], []
+        for o in cur:
+            done = (o["status"] or "").lower() == "erledigt"
+            (orders_done if done else orders_open).append(o)
 
 
-    # ---------- Medications ----------
-    # Ensure "given" column exists
-    try:
-        cur.execute("ALTER TABLE medications ADD COLUMN given INTEGER DEFAULT 0;"
-                    "ALTER TABLE medications ADD COLUMN not_given INTEGER DEFAULT 0;"
-                    )
-        conn.commit()
-    except sqlite3.OperationalError:
-        pass
-
-    if patient_id:
-        cur.execute("""
-            SELECT m.*, p.name AS patient_name, p.patient_identifier
-            FROM medications m
-            JOIN patients p ON p.id = m.patient_id
-            WHERE m.patient_id = ?
-            ORDER BY m.next_due;
-        """, (patient_id,))
-    else:
+        # ---------- Medications ----------
         cur.execute("""
             SELECT m.*, p.name AS patient_name, p.patient_identifier
             FROM medications m
             JOIN patients p ON p.id = m.patient_id
+            WHERE (:pid IS NULL OR m.patient_id = :pid)
             ORDER BY m.patient_id, m.next_due;
-        """)
-    meds = cur.fetchall()
-
-    # instead of only checking m["given"]
-    meds_open = [m for m in meds if not (m["given"] or 0) and not (m["not_given"] or 0)]
-    meds_done = [m for m in meds if (m["given"] or 0) or (m["not_given"] or 0)]
-
-    # ---- Medication administration history (last 20 entries) ----
-    cur.execute("""
-        SELECT 
-            ma.given_at,
-            n.name AS nurse_name,
-            m.name AS med_name,
-            m.dose
-        FROM med_administrations ma
-        JOIN medications m ON m.id = ma.med_id
-        LEFT JOIN nurses n ON n.id = ma.nurse_id
-        WHERE ma.patient_id = ?
-        ORDER BY datetime(ma.given_at) DESC
-        LIMIT 20;
-    """, (patient_id or 0,))
-    med_history = cur.fetchall()
+        """, {"pid": patient_id})
+        # documented either way counts as done, not just m["given"]
+        meds_open, meds_done = [], []
+        for m in cur:
+            done = (m["given"] or 0) or (m["not_given"] or 0)
+            (meds_done if done else meds_open).append(m)
+
+        # ---- Medication administration history (last 20 entries) ----
+        # both queries are patient-scoped; the all-patients page skips
+        # them instead of probing for patient_id 0 / NULL
+        if patient_id:
+            cur.execute("""
+                SELECT
+                    ma.given_at,
+                    n.name AS nurse_name,
+                    m.name AS med_name,
+                    m.dose
+                FROM med_administrations ma
+                JOIN medications m ON m.id = ma.med_id
+                LEFT JOIN nurses n ON n.id = ma.nurse_id
+                WHERE ma.patient_id = ?
+                ORDER BY ma.given_at DESC
+                LIMIT 20;
+            """, (patient_id,))
+            med_history = cur.fetchall()
 
-    cur.execute("""
-               SELECT alert, severity, created_at
-               FROM ai_alerts
-               WHERE patient_id = ?
-               ORDER BY datetime(created_at) DESC, id DESC;
-           """, (patient_id,))
-    alerts = cur.fetchall()
-
-    if selected_patient:
-        add_patient_tab(selected_patient["id"], selected_patient["name"],
-                        url_for("tasks_view", patient_id=selected_patient["id"]))
-        set_active_patient(selected_patient["id"])
-
-    current_nurse = get_current_nurse(conn)
-    conn.close()
-
-    conn.close()
-
-    return render_template(
-        "tasks.html",
-        alerts=alerts,
-        current_nurse=current_nurse,
-        patients=patients,
-        viewing_all_patients=viewing_all_patients,
-        selected_patient=selected_patient,
-        patient=patient,  # <-- add this
-        active_tab="tasks",
-        ai_tasks_open=ai_tasks_open,
-        ai_tasks_done=ai_tasks_done,
-        orders_open=orders_open,
-        orders_done=orders_done,
-        meds_open=meds_open,
-        meds_done=meds_done,
-        med_history=med_history
-        # if you already pass alerts, keep that here too
-    )
+            cur.execute(SQL_ALERTS_BY_PID, (patient_id,))
+            alerts = cur.fetchall()
+        else:
+            med_history = []
+            alerts = []
+
+        if selected_patient:
+            open_patient_tab(selected_patient["id"], selected_patient["name"],
+                             url_for("tasks_view", patient_id=selected_patient["id"]))
+
+        current_nurse = get_current_nurse(conn)
+
+
+        return render_template(
+            "tasks.html",
+            alerts=alerts,
+            current_nurse=current_nurse,
+            patients=patients,
+            viewing_all_patients=viewing_all_patients,
+            selected_patient=selected_patient,
+            patient=patient,  # <-- add this
+            active_tab="tasks",
+            ai_tasks_open=ai_tasks_open,
+            ai_tasks_done=ai_tasks_done,
+            orders_open=orders_open,
+            orders_done=orders_done,
+            meds_open=meds_open,
+            meds_done=meds_done,
+            med_history=med_history
+            # if you already pass alerts, keep that here too
+        )
 
 @app.route("/labs", methods=["GET", "POST"])
 def labs_view():
     patient_id = request.args.get("patient_id", type=int)
+    now = now_local()
 
-    conn = get_connection()
-    cur = conn.cursor()
+    with get_connection(write=request.method == "POST") as conn:
+        cur = conn.cursor()
 
-    # ----- Handle new lab order (POST) -----
-    if request.method == "POST":
-        # patient_id can come from hidden field or dropdown
-        form_pid = request.form.get("patient_id", type=int)
-        lab_name = (request.form.get("lab_name") or "").strip()
-        priority = request.form.get("priority") or "Routine"
+        # ----- Handle new lab order (POST) -----
+        if request.method == "POST":
+            # patient_id can come from hidden field or dropdown
+            form_pid = request.form.get("patient_id", type=int)
+            lab_name = (request.form.get("lab_name") or "").strip()
+            priority = request.form.get("priority") or "Routine"
 
-        # Decide which patient to use
-        effective_pid = form_pid or patient_id
+            # Decide which patient to use
+            effective_pid = form_pid or patient_id
 
-        if effective_pid and lab_name:
-            cur.execute("""
-                INSERT INTO lab_orders (patient_id, name, priority, status, ordered_at)
-                VALUES (?, ?, ?, ?, ?);
-            """, (
-                effective_pid,
-                lab_name,
-                priority,
-                "Ausstehend",
-                now_local().isoformat(timespec="minutes"),
-            ))
-            conn.commit()
+            if effective_pid and lab_name:
+                _begin_immediate(conn)
+                cur.execute("""
+                    INSERT INTO lab_orders (patient_id, name, priority, status, ordered_at)
+                    VALUES (?, ?, ?, ?, ?);
+                """, (
+                    effective_pid,
+                    lab_name,
+                    priority,
+                    "Ausstehend",
+                    now.isoformat(timespec="minutes"),
+                ))
+                conn.commit()
 
-            # Redirect to patient-specific labs view after ordering
-            return redirect(url_for("labs_view", patient_id=effective_pid))
+                # Redirect to patient-specific labs view after ordering
+                return redirect(url_for("labs_view", patient_id=effective_pid))
 
-    # ----- For GET (or after POST handling), load context -----
+        # ----- For GET (or after POST handling), load context -----
 
-    # 1) Patient vs all patients
-    if patient_id:
-        cur.execute("SELECT * FROM patients WHERE id = ?;", (patient_id,))
-        patient = cur.fetchone()
-        patients = [patient] if patient else []
-    else:
-        patient = None
-        cur.execute("""
-            SELECT id, name, patient_identifier
-            FROM patients
-            ORDER BY room;
-        """)
-        patients = cur.fetchall()
+        # One explicit read transaction around the four lookups below, so
+        # SQLite takes its shared lock once and all four see the same
+        # snapshot, instead of a BEGIN/END pair per autocommit SELECT.
+        cur.execute("BEGIN;")
 
-    # 2) Pending labs (status Ausstehend / Offen)
-    if patient_id:
+        # 1) Patient vs all patients
+        if patient_id:
+            cur.execute("SELECT id, name, patient_identifier FROM patients WHERE id = ?;",
+                        (patient_id,))
+            patient = cur.fetchone()
+            patients = [patient] if patient else []
+        else:
+            patient = None
+            cur.execute(SQL_PATIENT_LIST)
+            patients = cur.fetchall()
+
+        # 2) Pending labs (status Ausstehend / Offen).
+        # One statement for both the single-patient and ward-wide case:
+        # :pid IS NULL collapses the filter, so both callers share one
+        # cached plan instead of two near-identical SQL texts.
         cur.execute("""
-            SELECT lo.*, p.name AS patient_name, p.patient_identifier
+            SELECT lo.id, lo.name, lo.priority, lo.ordered_at
             FROM lab_orders lo
-            JOIN patients p ON p.id = lo.patient_id
-            WHERE lo.patient_id = ?
+            WHERE (:pid IS NULL OR lo.patient_id = :pid)
               AND lo.status IN ('Ausstehend', 'Offen')
             ORDER BY lo.ordered_at DESC, id DESC;
-        """, (patient_id,))
-    else:
-        cur.execute("""
-            SELECT lo.*, p.name AS patient_name, p.patient_identifier
-            FROM lab_orders lo
-            JOIN patients p ON p.id = lo.patient_id
-            WHERE lo.status IN ('Ausstehend', 'Offen')
-            ORDER BY lo.ordered_at DESC, id DESC;
-        """)
-    pending_labs = cur.fetchall()
+        """, {"pid": patient_id})
+        pending_labs = cur.fetchall()
 
-    # 3) Recent labs (last 5 days)
-    five_days_ago = (now_local() - timedelta(days=5)).isoformat(timespec="minutes")
+        # 3) Recent labs (last 5 days)
+        five_days_ago = (now - timedelta(days=5)).isoformat(timespec="minutes")
 
-    if patient_id:
-        cur.execute("""
-            SELECT lr.*, p.name AS patient_name, p.patient_identifier
-            FROM lab_results lr
-            JOIN patients p ON p.id = lr.patient_id
-            WHERE lr.patient_id = ?
-              AND lr.result_datetime >= ?
-            ORDER BY lr.result_datetime DESC, id DESC;
-        """, (patient_id, five_days_ago))
-    else:
         cur.execute("""
-            SELECT lr.*, p.name AS patient_name, p.patient_identifier
+            SELECT lr.id, lr.name, lr.result_value, lr.result_flag, lr.result_datetime,
+                   p.name AS patient_name, p.patient_identifier
             FROM lab_results lr
             JOIN patients p ON p.id = lr.patient_id
-            WHERE lr.result_datetime >= ?
-            ORDER BY lr.result_datetime DESC, id DESC;
-        """, (five_days_ago,))
-    recent_labs = cur.fetchall()
-
-    cur.execute("""
-            SELECT alert, severity, created_at
-            FROM ai_alerts
-            WHERE patient_id = ?
-            ORDER BY datetime(created_at) DESC, id DESC;
-        """, (patient_id,))
-    alerts = cur.fetchall()
-
-    if patient:
-        add_patient_tab(patient["id"], patient["name"], url_for("labs_view", patient_id=patient["id"]))
-        set_active_patient(patient["id"])
-
-    current_nurse = get_current_nurse(conn)
-    conn.close()
+            WHERE (:pid IS NULL OR lr.patient_id = :pid)
+              AND lr.result_datetime >= :cutoff
+            ORDER BY lr.result_datetime DESC, lr.id DESC;
+        """, {"pid": patient_id, "cutoff": five_days_ago})
+        recent_labs = cur.fetchall()
+
+        cur.execute(SQL_ALERTS_BY_PID, (patient_id,))
+        alerts = cur.fetchall()
+        conn.commit()
 
-    conn.close()
-    return render_template(
-        "labs.html",
-        alerts=alerts,
-        current_nurse=current_nurse,
-        patient=patient,
-        patients=patients,
-        patient_id=patient_id,
-        recent_labs=recent_labs,
-        pending_labs=pending_labs,
-        active_tab="labs",
-    )
+        if patient:
+            open_patient_tab(patient["id"], patient["name"], url_for("labs_view", patient_id=patient["id"]))
+
+        current_nurse = get_current_nurse(conn)
+
+        return render_template(
+            "labs.html",
+            alerts=alerts,
+            current_nurse=current_nurse,
+            patient=patient,
+            patients=patients,
+            patient_id=patient_id,
+            recent_labs=recent_labs,
+            pending_labs=pending_labs,
+            active_tab="labs",
+        )
 
 
 # ---------------------------------------------------------
@@ -1341,18 +1641,36 @@ def upload_photo(patient_id):
         return redirect(url_for("patient_detail", patient_id=patient_id))
 
     if file and allowed_file(file.filename):
-        filename = secure_filename(f"patient_{patient_id}_" + file.filename)
+        ext = "." + file.filename.rsplit(".", 1)[1].lower()
+
+        # Stream in 1 MiB chunks (instead of werkzeug's small default
+        # buffer) into a temp file while hashing, then store under the
+        # content hash: the same photo uploaded twice shares one file on
+        # disk, the name needs no sanitizing, and the os.replace into
+        # place is atomic so a half-written upload can never be served.
+        hasher = hashlib.blake2b(digest_size=16)
+        tmp = tempfile.NamedTemporaryFile(dir=UPLOAD_FOLDER, suffix=".part",
+                                          delete=False)
+        with tmp:
+            while chunk := file.stream.read(1 << 20):
+                hasher.update(chunk)
+                tmp.write(chunk)
+
+        filename = hasher.hexdigest() + ext
         filepath = UPLOAD_FOLDER / filename
-        file.save(filepath)
-
-        conn = get_connection()
-        cur = conn.cursor()
-        cur.execute(
-            "UPDATE patients SET photo_filename = ? WHERE id = ?;",
-            (filename, patient_id),
-        )
-        conn.commit()
-        conn.close()
+        if filepath.exists():
+            os.unlink(tmp.name)  # content already stored
+        else:
+            os.replace(tmp.name, filepath)
+
+        with get_connection(write=True) as conn:
+            cur = conn.cursor()
+            _begin_immediate(conn)
+            cur.execute(
+                "UPDATE patients SET photo_filename = ? WHERE id = ?;",
+                (filename, patient_id),
+            )
+            conn.commit()
 
     return redirect(url_for("patient_detail", patient_id=patient_id))
 
@@ -1370,10 +1688,13 @@ def toggle_task(task_id):
     """
 
     task_type = request.args.get("task_type", "ai")
-    conn = get_connection()
-    cur = conn.cursor()
+    now = now_local()
+    with get_connection(write=True) as conn:
+        cur = conn.cursor()
+        # every branch writes, so take the reserved lock before the
+        # read-validate step instead of upgrading mid-transaction
+        _begin_immediate(conn)
 
-    try:
         # ---------------- AI TASKS (with recurrence) ----------------
         if task_type == "ai":
             cur.execute("""
@@ -1389,15 +1710,6 @@ def toggle_task(task_id):
                 due_time_str = task["due_time"]
                 completed    = task["completed"]
 
-                # parse base due
-                if due_time_str:
-                    try:
-                        base_due = datetime.fromisoformat(due_time_str)
-                    except ValueError:
-                        base_due = now_local()
-                else:
-                    base_due = now_local()
-
                 if not completed:
                     # mark done
                     cur.execute("""
@@ -1406,52 +1718,57 @@ def toggle_task(task_id):
                         WHERE id = ?;
                     """, (task_id,))
 
-                    # create next occurrence
+                    # create next occurrence in one INSERT..SELECT:
+                    # SQLite's strftime does the date arithmetic on the
+                    # stored ISO string, falling back to now+interval
+                    # when due_time is empty or unparseable
                     interval_hours = get_default_interval_hours(description)
-                    next_due = base_due + timedelta(hours=interval_hours)
-                    next_due_str = next_due.isoformat(timespec="minutes")
+                    fallback_due = (now + timedelta(hours=interval_hours)).isoformat(timespec="minutes")
 
                     cur.execute("""
-                        INSERT INTO ai_tasks (patient_id, description, due_time, completed)
-                        VALUES (?, ?, ?, 0);
-                    """, (patient_id, description, next_due_str))
+                        INSERT INTO ai_tasks (patient_id, description, due_time, completed, category)
+                        SELECT patient_id, description,
+                               coalesce(strftime('%Y-%m-%dT%H:%M', due_time, :step), :fallback),
+                               0, category
+                        FROM ai_tasks
+                        WHERE id = :id;
+                    """, {
+                        "step": f"+{interval_hours} hours",
+                        "fallback": fallback_due,
+                        "id": task_id,
+                    })
                 else:
-                    # uncheck & remove future copies
-                    cur.execute("""
-                        UPDATE ai_tasks
-                        SET completed = 0
-                        WHERE id = ?;
-                    """, (task_id,))
-
+                    # uncheck: remove future copies first so re-opening
+                    # this row can't collide with the single-open-task
+                    # unique index
                     cur.execute("""
                         DELETE FROM ai_tasks
                         WHERE patient_id = ?
                           AND description = ?
                           AND completed = 0
-                          AND datetime(due_time) > datetime(?);
+                          AND due_time > ?;
                     """, (
                         patient_id,
                         description,
-                        due_time_str or now_local().isoformat(timespec="minutes"),
+                        due_time_str or now.isoformat(timespec="minutes"),
                     ))
 
+                    cur.execute("""
+                        UPDATE ai_tasks
+                        SET completed = 0
+                        WHERE id = ?;
+                    """, (task_id,))
+
         # ---------------- ORDERS (simple status toggle) ----------------
         elif task_type == "order":
+            # the old read-modify-write pair as one statement: the CASE
+            # flips the status in place during a single B-tree descent
             cur.execute("""
-                SELECT id, status
-                FROM orders
+                UPDATE orders
+                SET status = CASE WHEN lower(coalesce(status, '')) = 'erledigt'
+                                  THEN 'offen' ELSE 'erledigt' END
                 WHERE id = ?;
             """, (task_id,))
-            order = cur.fetchone()
-
-            if order:
-                current = (order["status"] or "").lower()
-                new_status = "erledigt" if current != "erledigt" else "offen"
-                cur.execute("""
-                    UPDATE orders
-                    SET status = ?
-                    WHERE id = ?;
-                """, (new_status, task_id,))
 
         # ---- Medications ----
         # ---------------- MEDICATIONS (gegeben / nicht gegeben + schedule next dose) ----------------
@@ -1469,69 +1786,56 @@ def toggle_task(task_id):
             med = cur.fetchone()
 
             if not med:
-                conn.close()
+                conn.rollback()
                 return redirect(request.referrer or url_for("tasks_view"))
 
-            current_nurse = get_current_nurse(conn)
             given = med["given"] or 0
             not_given = med["not_given"] or 0
             schedule = med["schedule"] or ""
-            next_due_str = med["next_due"]
-
-            # ---- parse base time (for calculating the next due) ----
-            base_due = now_local()
-            if next_due_str:
-                try:
-                    # full timestamp "YYYY-MM-DD HH:MM" or ISO
-                    if ("T" in next_due_str) or (" " in next_due_str and ":" in next_due_str):
-                        cleaned = next_due_str.replace(" ", "T")
-                        base_due = datetime.fromisoformat(cleaned)
-                    else:
-                        # e.g. "08:00" → today 08:00
-                        hours, minutes = map(int, next_due_str.split(":"))
-                        from datetime import time as dt_time
-                        base_due = datetime.combine(
-                            datetime.today().date(),
-                            dt_time(hour=hours, minute=minutes)
-                        )
-                except ValueError:
-                    base_due = datetime.now()
 
             interval_hours = get_med_interval_hours(schedule)
-            base_due_str_for_delete = next_due_str or now_local().isoformat(timespec="minutes")
 
             # --------- ACTION: GEGEBEN ---------
             if action == "given":
                 if not given:
-                    # mark THIS dose as given
+                    # document the administration in the history table and
+                    # advance THIS row to its next dose. One row per
+                    # recurring med: no per-dose INSERT, no future copies
+                    # to DELETE on undo, table stays O(active meds).
+                    # (the undo arms never need the nurse, so it is only
+                    # fetched here)
+                    current_nurse = get_current_nurse(conn)
                     last_by = current_nurse["name"] if current_nurse else None
-                    last_at = now_local().strftime("%Y-%m-%d %H:%M")
+                    last_at = now.strftime("%Y-%m-%d %H:%M")
 
-                    cur.execute("""
+                    cur.execute(f"""
                         UPDATE medications
-                        SET given = 1,
+                        SET given = 0,
                             not_given = 0,
-                            last_given_by = ?,
-                            last_given_at = ?
-                        WHERE id = ?;
-                    """, (last_by, last_at, task_id))
-
-                    # create NEXT dose as new, open row
-                    new_next_due = (base_due + timedelta(hours=interval_hours)).isoformat(timespec="minutes")
+                            last_given_by = :by,
+                            last_given_at = :at,
+                            next_due = {SQL_MED_NEXT_DUE_EXPR}
+                        WHERE id = :id;
+                    """, {
+                        "by": last_by,
+                        "at": last_at,
+                        "step": f"+{interval_hours} hours",
+                        "fallback": (now + timedelta(hours=interval_hours)).isoformat(timespec="minutes"),
+                        "id": task_id,
+                    })
 
                     cur.execute("""
-                        INSERT INTO medications (patient_id, name, dose, route, schedule, next_due)
-                        VALUES (?, ?, ?, ?, ?, ?);
+                        INSERT INTO med_administrations (patient_id, med_id, nurse_id, given_at)
+                        VALUES (?, ?, ?, ?);
                     """, (
                         med["patient_id"],
-                        med["name"],
-                        med["dose"],
-                        med["route"],
-                        schedule,
-                        new_next_due,
+                        task_id,
+                        current_nurse["id"] if current_nurse else None,
+                        now.isoformat(timespec="minutes"),
                     ))
                 else:
-                    # UNDO "gegeben": set back to offene Dosis & remove the future open copy
+                    # UNDO "gegeben" on a row still flagged by the old
+                    # per-dose model: just reopen it.
                     cur.execute("""
                         UPDATE medications
                         SET given = 0,
@@ -1541,133 +1845,102 @@ def toggle_task(task_id):
                         WHERE id = ?;
                     """, (task_id,))
 
-                    cur.execute("""
-                        DELETE FROM medications
-                        WHERE patient_id = ?
-                          AND name = ?
-                          AND schedule = ?
-                          AND given = 0
-                          AND not_given = 0
-                          AND datetime(next_due) > datetime(?);
-                    """, (
-                        med["patient_id"],
-                        med["name"],
-                        schedule,
-                        base_due_str_for_delete,
-                    ))
-
             # --------- ACTION: NICHT GEGEBEN ---------
             elif action == "not_given":
                 if not not_given:
-                    # mark THIS dose as not given (but still documented)
+                    # mark THIS dose as not given (but still documented),
+                    # and plan the next dose on the same row
+                    current_nurse = get_current_nurse(conn)
                     last_by = current_nurse["name"] if current_nurse else None
-                    last_at = now_local().strftime("%Y-%m-%d %H:%M")
+                    last_at = now.strftime("%Y-%m-%d %H:%M")
 
-                    cur.execute("""
+                    cur.execute(f"""
                         UPDATE medications
                         SET not_given = 1,
                             given = 0,
-                            last_given_by = ?,
-                            last_given_at = ?
-                        WHERE id = ?;
-                    """, (last_by, last_at, task_id))
-
-                    # plan NEXT dose anyway
-                    new_next_due = (base_due + timedelta(hours=interval_hours)).isoformat(timespec="minutes")
-
-                    cur.execute("""
-                        INSERT INTO medications (patient_id, name, dose, route, schedule, next_due)
-                        VALUES (?, ?, ?, ?, ?, ?);
-                    """, (
-                        med["patient_id"],
-                        med["name"],
-                        med["dose"],
-                        med["route"],
-                        schedule,
-                        new_next_due,
-                    ))
+                            last_given_by = :by,
+                            last_given_at = :at,
+                            next_due = {SQL_MED_NEXT_DUE_EXPR}
+                        WHERE id = :id;
+                    """, {
+                        "by": last_by,
+                        "at": last_at,
+                        "step": f"+{interval_hours} hours",
+                        "fallback": (now + timedelta(hours=interval_hours)).isoformat(timespec="minutes"),
+                        "id": task_id,
+                    })
                 else:
-                    # UNDO "nicht gegeben": set back to offene Dosis & remove the future open copy
-                    cur.execute("""
+                    # UNDO "nicht gegeben": reopen the dose and roll the
+                    # schedule back one interval
+                    cur.execute(f"""
                         UPDATE medications
                         SET not_given = 0,
                             given = 0,
                             last_given_by = NULL,
-                            last_given_at = NULL
-                        WHERE id = ?;
-                    """, (task_id,))
-
-                    cur.execute("""
-                        DELETE FROM medications
-                        WHERE patient_id = ?
-                          AND name = ?
-                          AND schedule = ?
-                          AND given = 0
-                          AND not_given = 0
-                          AND datetime(next_due) > datetime(?);
-                    """, (
-                        med["patient_id"],
-                        med["name"],
-                        schedule,
-                        base_due_str_for_delete,
-                    ))
+                            last_given_at = NULL,
+                            next_due = {SQL_MED_NEXT_DUE_EXPR}
+                        WHERE id = :id;
+                    """, {
+                        "step": f"-{interval_hours} hours",
+                        "fallback": (now - timedelta(hours=interval_hours)).isoformat(timespec="minutes"),
+                        "id": task_id,
+                    })
 
         conn.commit()
         return redirect(request.referrer or url_for("tasks_view"))
 
 
-    finally:
-        conn.close()
-
 
 @app.post("/patient/<int:patient_id>/delete_photo")
 def delete_photo(patient_id):
-    conn = get_connection()
-    cur = conn.cursor()
+    with get_connection(write=True) as conn:
+        cur = conn.cursor()
+        _begin_immediate(conn)
 
-    # Get the current filename
-    cur.execute("SELECT photo_filename FROM patients WHERE id = ?;", (patient_id,))
-    row = cur.fetchone()
-    if row and row["photo_filename"]:
-        filepath = UPLOAD_FOLDER / row["photo_filename"]
-        if filepath.exists():
-            try:
-                filepath.unlink()   # delete the file
-            except (Exception,):
-                pass  # Avoid crash if file is locked or missing
-
-    # Reset DB entry
-    cur.execute(
-        "UPDATE patients SET photo_filename = NULL WHERE id = ?;",
-        (patient_id,)
-    )
-    conn.commit()
-    conn.close()
+        # Grab the old filename and clear the DB entry before touching
+        # the filesystem, so the unlink happens after the commit instead
+        # of inside the write transaction.
+        cur.execute("SELECT photo_filename FROM patients WHERE id = ?;", (patient_id,))
+        row = cur.fetchone()
+        cur.execute(
+            "UPDATE patients SET photo_filename = NULL WHERE id = ?;",
+            (patient_id,)
+        )
+        # content-addressed storage: only unlink once no other patient
+        # still references the same file
+        still_used = 0
+        if row and row["photo_filename"]:
+            cur.execute("SELECT COUNT(*) FROM patients WHERE photo_filename = ?;",
+                        (row["photo_filename"],))
+            still_used = cur.fetchone()[0]
+        conn.commit()
 
-    return redirect(url_for("patient_detail", patient_id=patient_id))
+        if row and row["photo_filename"] and not still_used:
+            (UPLOAD_FOLDER / row["photo_filename"]).unlink(missing_ok=True)
+
+        return redirect(url_for("patient_detail", patient_id=patient_id))
 
 @app.route("/select_nurse", methods=["GET", "POST"])
 def select_nurse():
-    conn = get_connection()
-    cur = conn.cursor()
+    with get_connection() as conn:
+        cur = conn.cursor()
 
-    if request.method == "POST":
-        nurse_id = request.form.get("nurse_id")
-        if nurse_id:
-            session["current_nurse_id"] = int(nurse_id)
-        conn.close()
-        return redirect(url_for("voice_doc"))
+        if request.method == "POST":
+            nurse_id = request.form.get("nurse_id")
+            if nurse_id:
+                session["current_nurse_id"] = int(nurse_id)
+                _nurse_cache.clear()
+            return redirect(url_for("voice_doc"))
 
-    # GET → show list of nurses
-    cur.execute("SELECT id, name FROM nurses ORDER BY name;")
-    nurses = cur.fetchall()
-    current_nurse = get_current_nurse(conn)
-    conn.close()
+        # GET → show list of nurses
+        cur.execute("SELECT id, name FROM nurses ORDER BY name;")
+        nurses = cur.fetchall()
+        current_nurse = get_current_nurse(conn)
 
 
-    return render_template("select_nurse.html",
-                           nurses=nurses,
-                           current_nurse=current_nurse)
+        return render_template("select_nurse.html",
+                               nurses=nurses,
+                               current_nurse=current_nurse)
 
 @app.get("/logout")
 def logout():
@@ -1684,95 +1957,95 @@ def voice_doc():
         return redirect(url_for("select_nurse"))
 
 
-    conn = get_connection()
-    cur = conn.cursor()
-
-
-    current_nurse = get_current_nurse(conn)
-    author = current_nurse["name"] if current_nurse else "Sprachdokumentation"
-
-
-    if request.method == "POST":
-        patient_identifier = (request.form.get("patient_identifier") or "").strip()
-        spoken_text = (request.form.get("spoken_text") or "").strip()
-        selected_text = (request.form.get("selected_text") or "").strip()
-
-
-        # 1) find patient first
-        cur.execute("SELECT id FROM patients WHERE patient_identifier = ?;", (patient_identifier,))
-        patient = cur.fetchone()
-        if not patient:
-            conn.close()
-            # optional: flash("Patient nicht gefunden")
-            return redirect(url_for("voice_doc"))
-
+    with get_connection(write=request.method == "POST") as conn:
+        cur = conn.cursor()
 
-        patient_id = patient["id"]
 
+        current_nurse = get_current_nurse(conn)
+        author = current_nurse["name"] if current_nurse else "Sprachdokumentation"
 
-        saved_anything = False
 
+        if request.method == "POST":
+            patient_identifier = (request.form.get("patient_identifier") or "").strip()
+            spoken_text = (request.form.get("spoken_text") or "").strip()
+            selected_text = (request.form.get("selected_text") or "").strip()
 
-        # 2) save a nurse note (even if no task)
-        if spoken_text:
-            cur.execute("""
-                INSERT INTO nurse_notes (patient_id, note, created_at, author)
-                VALUES (?, ?, ?, ?);
-            """, (
-                patient_id,
-                spoken_text,
-                now_local().isoformat(timespec="minutes"),
-                author,
-            ))
-            saved_anything = True
 
-            # 2) ALSO create an "empty" assessment row so priorities can run
-            cur.execute("""
-                INSERT INTO assessments (patient_id, created_at, other_notes)
-                VALUES (?, ?, ?);
-            """, (
-                patient_id,
-                now_local().isoformat(timespec="minutes"),
-                ""  # keep empty; the note is already in nurse_notes
-            ))
+            # 1) find patient first (cached identifier→id map; the form
+            # only carries the scanned/typed identifier)
+            patient_id = patient_id_by_identifier(conn, patient_identifier)
+            if patient_id is None:
+                # optional: flash("Patient nicht gefunden")
+                return redirect(url_for("voice_doc"))
 
-            conn.commit()
 
-            update_bezugspflege_by_interactions(conn, patient_id)
-            conn.commit()
+            saved_anything = False
+            # One timestamp for the whole submission; every row of this
+            # POST should carry the same minute anyway.
+            now_iso = now_local().isoformat(timespec="minutes")
 
-            # 3) Now priorities/tasks/alerts can run (because a latest assessment exists)
-            generate_priorities_and_tasks(conn, patient_id)
-            conn.commit()
+            # One transaction for the whole submission: note, assessment
+            # stub and completed tasks land (or roll back) together
+            # instead of a commit/fsync per section.
+            _begin_immediate(conn)
 
-        # 3) optionally create completed tasks from MULTIPLE selected phrases (one per line)
-        lines = [ln.strip() for ln in selected_text.splitlines() if ln.strip()]
+            # 2) save a nurse note (even if no task)
+            if spoken_text:
+                cur.execute("""
+                    INSERT INTO nurse_notes (patient_id, note, created_at, author)
+                    VALUES (?, ?, ?, ?);
+                """, (
+                    patient_id,
+                    spoken_text,
+                    now_iso,
+                    author,
+                ))
+                saved_anything = True
 
-        for line in lines:
-            task_desc = map_selected_phrase_to_task(line)
-            if task_desc:
+                # 2) ALSO create an "empty" assessment row so priorities can run
                 cur.execute("""
-                    INSERT INTO ai_tasks (patient_id, description, due_time, completed)
-                    VALUES (?, ?, ?, 1);
+                    INSERT INTO assessments (patient_id, created_at, other_notes)
+                    VALUES (?, ?, ?);
                 """, (
                     patient_id,
-                    task_desc,
-                    now_local().isoformat(timespec="minutes"),
+                    now_iso,
+                    ""  # keep empty; the note is already in nurse_notes
                 ))
+
+            # 3) optionally create completed tasks from MULTIPLE selected phrases (one per line)
+            lines = [ln.strip() for ln in selected_text.splitlines() if ln.strip()]
+
+            task_rows = []
+            for line in lines:
+                task_desc = map_selected_phrase_to_task(line)
+                if task_desc:
+                    task_rows.append((
+                        patient_id,
+                        task_desc,
+                        now_iso,
+                        _TASK_CATEGORIES.get(task_desc),
+                    ))
+            if task_rows:
+                cur.executemany("""
+                    INSERT INTO ai_tasks (patient_id, description, due_time, completed, category)
+                    VALUES (?, ?, ?, 1, ?);
+                """, task_rows)
                 saved_anything = True
 
-        if saved_anything:
-            conn.commit()
+            if saved_anything:
+                conn.commit()
+
+            if spoken_text:
+                # Recompute on top of the committed note/assessment without
+                # holding up the redirect; the worker uses its own connection.
+                schedule_recompute(patient_id)
 
-        conn.close()
-        return redirect(url_for("tasks_view", patient_id=patient_id))
+            return redirect(url_for("tasks_view", patient_id=patient_id))
 
-    current_nurse = get_current_nurse(conn)
-    conn.close()
+        current_nurse = get_current_nurse(conn)
 
-    conn.close()
-    return render_template("voice_doc.html",
-                current_nurse=current_nurse)
+        return render_template("voice_doc.html",
+                    current_nurse=current_nurse)
 
 
 
@@ -1782,54 +2055,69 @@ def api_patient_lookup():
     if not identifier:
         return jsonify({"ok": False, "error": "missing identifier"}), 400
 
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("""
-        SELECT id, name, patient_identifier
-        FROM patients
-        WHERE patient_identifier = ?;
-    """, (identifier,))
-    row = cur.fetchone()
-    conn.close()
+    # repeat scans answer straight from the process cache without
+    # borrowing a pooled connection at all
+    hit = _patients_by_identifier.get(identifier)
+    if hit is None:
+        with get_connection() as conn:
+            hit = patient_by_identifier(conn, identifier)
 
-    if not row:
+    if hit is None:
         return jsonify({"ok": False, "error": "not found"}), 404
 
-    return jsonify({
-        "ok": True,
-        "name": row["name"],
-        "patient_identifier": row["patient_identifier"],
-    })
-
-
-@app.post("/tabs/close")
-def close_patient_tab():
-    patient_id = int(request.form.get("patient_id", 0))
+    etag = 'W/"%s"' % hashlib.blake2b(
+        f"{identifier}|{hit[1]}".encode(), digest_size=8
+    ).hexdigest()
+    if request.headers.get("If-None-Match") == etag:
+        # revalidation of a stale cached answer: skip the JSON body
+        resp = app.response_class(status=304)
+    else:
+        resp = jsonify({
+            "ok": True,
+            "name": hit[1],
+            "patient_identifier": identifier,
+        })
+    resp.headers["ETag"] = etag
+    # Identifier→name mappings never change after seeding, so let the
+    # scanner page reuse its answer instead of re-polling per scan.
+    resp.cache_control.private = True
+    resp.cache_control.max_age = 300
+    return resp
+
+
+def _close_tab(patient_id: int):
+    """
+    Drop the patient's tab and fix up the active patient in one pass.
+    The old code filtered the list, then searched for the closed tab's
+    index, then searched again for the new active tab — three scans per
+    close. One walk now collects the survivors and remembers the index.
+    """
     tabs = _get_tabs()
-    if not tabs:
-        return redirect(_safe_referrer())
-
-    # Remove the tab
-    new_tabs = [t for t in tabs if int(t.get("patient_id")) != patient_id]
+    new_tabs = []
+    old_index = None
+    for i, t in enumerate(tabs):
+        if t["patient_id"] == patient_id:
+            old_index = i
+        else:
+            new_tabs.append(t)
+    if old_index is None:
+        # tab wasn't open — leave the session untouched so the cookie
+        # isn't re-signed for a no-op close
+        return tabs
     _set_tabs(new_tabs)
 
     active = session.get("active_patient_id")
-    closed_was_active = (active is not None and int(active) == patient_id)
-
-    # Decide new active if needed
-    if closed_was_active:
+    if active is not None and int(active) == patient_id:
         if new_tabs:
             # pick the next tab (same index if possible)
-            try:
-                old_index = next(i for i, t in enumerate(tabs) if int(t.get("patient_id")) == patient_id)
-            except StopIteration:
-                old_index = 0
             next_index = min(old_index, len(new_tabs) - 1)
-            new_active = int(new_tabs[next_index]["patient_id"])
-            _set_active_patient_id(new_active)
+            _set_active_patient_id(new_tabs[next_index]["patient_id"])
         else:
             session.pop("active_patient_id", None)
+    return new_tabs
+
 
+def _redirect_after_close(patient_id: int, new_tabs):
     # Redirect logic:
     # - If you're on a page that belongs to the patient you just closed, go to next patient (or Home)
     # - Otherwise, stay where you are (referrer)
@@ -1837,7 +2125,7 @@ def close_patient_tab():
         if new_tabs:
             # go to the active patient's last saved url
             active_id = int(session.get("active_patient_id"))
-            active_tab = next((t for t in new_tabs if int(t.get("patient_id")) == active_id), None)
+            active_tab = next((t for t in new_tabs if t["patient_id"] == active_id), None)
             if active_tab and active_tab.get("url"):
                 return redirect(active_tab["url"])
         return redirect(url_for("home"))
@@ -1845,6 +2133,16 @@ def close_patient_tab():
     return redirect(_safe_referrer())
 
 
+@app.post("/tabs/close")
+def close_patient_tab():
+    patient_id = int(request.form.get("patient_id", 0))
+    if not _get_tabs():
+        return redirect(_safe_referrer())
+
+    new_tabs = _close_tab(patient_id)
+    return _redirect_after_close(patient_id, new_tabs)
+
+
 @app.post("/tabs/close_current")
 def close_current_patient():
     active = session.get("active_patient_id")
@@ -1852,46 +2150,31 @@ def close_current_patient():
         return redirect(_safe_referrer())
 
     patient_id = int(active)
-    tabs = _get_tabs()
-    if not tabs:
+    if not _get_tabs():
         session.pop("active_patient_id", None)
         return redirect(_safe_referrer())
 
-    # Remove active tab
-    new_tabs = [t for t in tabs if int(t.get("patient_id")) != patient_id]
-    _set_tabs(new_tabs)
+    new_tabs = _close_tab(patient_id)
+    return _redirect_after_close(patient_id, new_tabs)
 
-    # Pick next active
-    if new_tabs:
-        try:
-            old_index = next(i for i, t in enumerate(tabs) if int(t.get("patient_id")) == patient_id)
-        except StopIteration:
-            old_index = 0
-        next_index = min(old_index, len(new_tabs) - 1)
-        new_active = int(new_tabs[next_index]["patient_id"])
-        _set_active_patient_id(new_active)
-    else:
-        session.pop("active_patient_id", None)
+@functools.lru_cache(maxsize=4096)
+def _format_dt_cached(value):
+    dt = datetime.fromisoformat(value)
+    return dt.astimezone(LOCAL_TZ).strftime("%d.%m.%Y %H:%M")
 
-    # Same redirect rule as above
-    if _referrer_is_patient_page_for(patient_id):
-        if new_tabs:
-            active_id = int(session.get("active_patient_id"))
-            active_tab = next((t for t in new_tabs if int(t.get("patient_id")) == active_id), None)
-            if active_tab and active_tab.get("url"):
-                return redirect(active_tab["url"])
-        return redirect(url_for("home"))
-
-    return redirect(_safe_referrer())
 
 @app.template_filter("format_dt")
 def format_dt(value):
+    # Timestamps repeat a lot across table cells (shared due times, batch
+    # inserts in the same minute), so cache the parse+format per string.
     if not value:
         return "–"
+    if isinstance(value, datetime):
+        # already-parsed values from Python code paths need no re-parse
+        return value.astimezone(LOCAL_TZ).strftime("%d.%m.%Y %H:%M")
     try:
-        dt = datetime.fromisoformat(value)
-        return dt.astimezone(LOCAL_TZ).strftime("%d.%m.%Y %H:%M")
-    except:
+        return _format_dt_cached(value)
+    except (ValueError, TypeError):
         return value
 
 
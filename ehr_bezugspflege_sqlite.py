@@ -1,25 +1,57 @@
 import sqlite3
+from functools import lru_cache
+from itertools import chain
 from pathlib import Path
 from datetime import datetime, timedelta
 
 DB_PATH = Path("ehr_bezugspflege.db")
 
-# Delete old DB if it exists (recreates everything fresh)
+# Bump whenever the DDL below changes so stale files get rebuilt.
+SCHEMA_VERSION = 1
+
+# Reuse the existing file when its schema is current: emptying the
+# tables lets SQLite recycle the allocated pages instead of recreating
+# the file (and its WAL/shm siblings) from nothing. A version mismatch
+# falls back to the full delete-and-rebuild.
+fresh = True
 if DB_PATH.exists():
-    DB_PATH.unlink()
+    probe = sqlite3.connect(DB_PATH)
+    same_schema = probe.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+    probe.close()
+    if same_schema:
+        fresh = False
+    else:
+        DB_PATH.unlink()
 
 conn = sqlite3.connect(DB_PATH)
+# Manage the transaction by hand: one BEGIN before the seed data and one
+# COMMIT at the end, instead of the driver's implicit per-statement ones.
+conn.isolation_level = None
 cur = conn.cursor()
 
+# Bulk-load settings: the database is rebuilt from scratch, so durability
+# during seeding does not matter. The app switches to WAL on first start.
+cur.execute("PRAGMA synchronous=OFF;")
+cur.execute("PRAGMA journal_mode=MEMORY;")
+cur.execute("PRAGMA temp_store=MEMORY;")
+cur.execute("PRAGMA locking_mode=EXCLUSIVE;")
+cur.execute("PRAGMA cache_size=-65536;")  # 64 MB; the whole seed fits in the page cache
+
 # ----------------------------
 # Helpers for dynamic dates
 # ----------------------------
+
+# One clock read for the whole script: every generated timestamp hangs
+# off the same instant, so the data is self-consistent per run.
+NOW = datetime.now().replace(second=0, microsecond=0)
+NOW_ISO = NOW.isoformat(timespec="minutes")
+
 def now_dt():
-    return datetime.now()
+    return NOW
 
 def now_local_iso_minutes():
     # if you already have now_local() in app.py, here we keep it simple:
-    return datetime.now().isoformat(timespec="minutes")
+    return NOW_ISO
 
 def iso_minutes(dt: datetime) -> str:
     return dt.replace(second=0, microsecond=0).isoformat(timespec="minutes")
@@ -27,6 +59,12 @@ def iso_minutes(dt: datetime) -> str:
 def date_str(dt: datetime) -> str:
     return dt.strftime("%Y-%m-%d")
 
+@lru_cache(maxsize=32)
+def ago(hours: int) -> str:
+    """ISO timestamp N hours before NOW; the note literals repeat a
+    handful of offsets, so cache the formatted strings."""
+    return iso_minutes(NOW - timedelta(hours=hours))
+
 def dt_days_ago(days: int) -> datetime:
     return now_dt() - timedelta(days=days)
 
@@ -47,19 +85,23 @@ def next_time_today_or_tomorrow(hour: int, minute: int = 0) -> datetime:
 # ----------------------------
 # Tables (same schema you use)
 # ----------------------------
-
-# ---- Nurses ----
-cur.execute("""
+# One executescript for the whole schema instead of fifteen separate
+# execute calls: a single parse/dispatch round trip for all DDL.
+
+if fresh:
+    cur.executescript("""
+-- ---- Nurses ----
+-- AUTOINCREMENT is dropped throughout: plain INTEGER PRIMARY KEY gives
+-- the same ascending ids without maintaining a sqlite_sequence row on
+-- every insert. Small lookup tables are STRICT (SQLite >= 3.37).
 CREATE TABLE nurses (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    id INTEGER PRIMARY KEY,
     name TEXT NOT NULL
-);
-""")
+) STRICT;
 
-# ---- Patients ----
-cur.execute("""
+-- ---- Patients ----
 CREATE TABLE patients (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    id INTEGER PRIMARY KEY,
     patient_identifier TEXT NOT NULL,
     name TEXT NOT NULL,
     gender TEXT,
@@ -75,12 +117,10 @@ CREATE TABLE patients (
     photo_filename TEXT,
     FOREIGN KEY (bezugspflege_id) REFERENCES nurses(id)
 );
-""")
 
-# ---- Medications ----
-cur.execute("""
+-- ---- Medications ----
 CREATE TABLE medications (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    id INTEGER PRIMARY KEY,
     patient_id INTEGER NOT NULL,
     name TEXT NOT NULL,
     dose TEXT,
@@ -95,12 +135,10 @@ CREATE TABLE medications (
     last_given_at TEXT,
     FOREIGN KEY (patient_id) REFERENCES patients(id)
 );
-""")
 
-# ---- Med administrations (history) ----
-cur.execute("""
+-- ---- Med administrations (history) ----
 CREATE TABLE med_administrations (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    id INTEGER PRIMARY KEY,
     patient_id INTEGER NOT NULL,
     med_id INTEGER NOT NULL,
     nurse_id INTEGER,
@@ -109,12 +147,10 @@ CREATE TABLE med_administrations (
     FOREIGN KEY (med_id) REFERENCES medications(id),
     FOREIGN KEY (nurse_id) REFERENCES nurses(id)
 );
-""")
 
-# ---- Orders / tasks ----
-cur.execute("""
+-- ---- Orders / tasks ----
 CREATE TABLE orders (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    id INTEGER PRIMARY KEY,
     patient_id INTEGER NOT NULL,
     description TEXT NOT NULL,
     due_date TEXT,
@@ -125,36 +161,30 @@ CREATE TABLE orders (
     completed INTEGER DEFAULT 0,
     FOREIGN KEY (patient_id) REFERENCES patients(id)
 );
-""")
 
-# ---- Doctor notes ----
-cur.execute("""
+-- ---- Doctor notes ----
 CREATE TABLE doctor_notes (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    id INTEGER PRIMARY KEY,
     patient_id INTEGER NOT NULL,
     note TEXT NOT NULL,
     created_at TEXT,
     author TEXT,
     FOREIGN KEY (patient_id) REFERENCES patients(id)
 );
-""")
 
-# ---- Nurse notes ----
-cur.execute("""
+-- ---- Nurse notes ----
 CREATE TABLE nurse_notes (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    id INTEGER PRIMARY KEY,
     patient_id INTEGER NOT NULL,
     note TEXT NOT NULL,
     created_at TEXT,
     author TEXT,
     FOREIGN KEY (patient_id) REFERENCES patients(id)
 );
-""")
 
-# ---- Labs ----
-cur.execute("""
+-- ---- Labs ----
 CREATE TABLE labs (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    id INTEGER PRIMARY KEY,
     patient_id INTEGER NOT NULL,
     test_name TEXT NOT NULL,
     result_value TEXT,
@@ -166,12 +196,10 @@ CREATE TABLE labs (
     comment TEXT,
     FOREIGN KEY (patient_id) REFERENCES patients(id)
 );
-""")
 
-# ---- Assessments (Flowsheet) ----
-cur.execute("""
+-- ---- Assessments (Flowsheet) ----
 CREATE TABLE assessments (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    id INTEGER PRIMARY KEY,
     patient_id INTEGER NOT NULL,
     created_at TEXT,
     author TEXT,
@@ -202,47 +230,40 @@ CREATE TABLE assessments (
 
     FOREIGN KEY (patient_id) REFERENCES patients(id)
 );
-""")
 
-# ---- AI priorities ----
-cur.execute("""
+-- ---- AI priorities ----
 CREATE TABLE patient_priorities (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    id INTEGER PRIMARY KEY,
     patient_id INTEGER NOT NULL,
     priority_rank INTEGER NOT NULL,
     problem TEXT NOT NULL,
     FOREIGN KEY (patient_id) REFERENCES patients(id)
-);
-""")
+) STRICT;
 
-# ---- AI tasks ----
-cur.execute("""
+-- ---- AI tasks ----
 CREATE TABLE ai_tasks (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    id INTEGER PRIMARY KEY,
     patient_id INTEGER NOT NULL,
     description TEXT NOT NULL,
     due_time TEXT,
     completed INTEGER DEFAULT 0,
+    category TEXT,
     FOREIGN KEY (patient_id) REFERENCES patients(id)
 );
-""")
 
-# ---- AI alerts ----
-cur.execute("""
+-- ---- AI alerts ----
 CREATE TABLE IF NOT EXISTS ai_alerts (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    id INTEGER PRIMARY KEY,
     patient_id INTEGER NOT NULL,
     alert TEXT NOT NULL,
     severity TEXT,
     created_at TEXT,
     FOREIGN KEY (patient_id) REFERENCES patients(id)
 );
-""")
 
-# ---- Lab results ----
-cur.execute("""
+-- ---- Lab results ----
 CREATE TABLE IF NOT EXISTS lab_results (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    id INTEGER PRIMARY KEY,
     patient_id INTEGER NOT NULL,
     name TEXT NOT NULL,
     result_value TEXT,
@@ -250,12 +271,10 @@ CREATE TABLE IF NOT EXISTS lab_results (
     result_datetime TEXT,
     FOREIGN KEY (patient_id) REFERENCES patients(id)
 );
-""")
 
-# ---- Lab orders ----
-cur.execute("""
+-- ---- Lab orders ----
 CREATE TABLE IF NOT EXISTS lab_orders (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    id INTEGER PRIMARY KEY,
     patient_id INTEGER NOT NULL,
     name TEXT NOT NULL,
     priority TEXT,
@@ -263,12 +282,36 @@ CREATE TABLE IF NOT EXISTS lab_orders (
     ordered_at TEXT,
     FOREIGN KEY (patient_id) REFERENCES patients(id)
 );
+""")
+    cur.execute(f"PRAGMA user_version = {SCHEMA_VERSION};")
+else:
+    # Same schema: empty the tables (children before parents, for the
+    # foreign keys) and reuse the pages.
+    cur.executescript("""
+DELETE FROM med_administrations;
+DELETE FROM medications;
+DELETE FROM orders;
+DELETE FROM doctor_notes;
+DELETE FROM nurse_notes;
+DELETE FROM labs;
+DELETE FROM assessments;
+DELETE FROM patient_priorities;
+DELETE FROM ai_tasks;
+DELETE FROM ai_alerts;
+DELETE FROM lab_results;
+DELETE FROM lab_orders;
+DELETE FROM patients;
+DELETE FROM nurses;
 """)
 
 # ----------------------------
 # Seed data
 # ----------------------------
 
+# All inserts below land in a single transaction (executescript above
+# would implicitly commit, so the DDL stays outside of it).
+cur.execute("BEGIN")
+
 # Nurses (keep 3)
 cur.executemany(
     "INSERT INTO nurses (name) VALUES (?);",
@@ -284,27 +327,27 @@ cur.executemany(
 # Discharge is relative to now: 1–6 days from now
 patients = [
     ("P-100001", "Maria Braun",   "F", "1980-03-14", "1A", "Herzinsuffizienz", 1,
-     "Latex", "Keine Reha/Intub", dt_days_ago(3), dt_days_from_now(3), "Dr. Keller"),
+     "Latex", "Keine Reha/Intub", date_str(dt_days_ago(3)), date_str(dt_days_from_now(3)), "Dr. Keller"),
     ("P-100002", "Sarah Schulz",     "F", "1972-08-09", "1B", "NSTEMI", 1,
-     "ASS", "nicht festgelegt", dt_days_ago(2), dt_days_from_now(2), "Dr. Roth"),
+     "ASS", "nicht festgelegt", date_str(dt_days_ago(2)), date_str(dt_days_from_now(2)), "Dr. Roth"),
     ("P-100003", "Rolf Schwarz",    "M", "1968-11-22", "2A", "Vorhofflimmern", 1,
-     "Jod", "nicht festgelegt", dt_days_ago(5), dt_days_from_now(2), "Dr. Klein"),
+     "Jod", "nicht festgelegt", date_str(dt_days_ago(5)), date_str(dt_days_from_now(2)), "Dr. Klein"),
     ("P-100004", "Jan Fischer",   "M", "1959-05-18", "2B", "Herzinsuffizienz", 1,
-     "Penicillin", "Alles gewünscht", dt_days_ago(4), dt_days_from_now(4), "Dr. Keller"),
+     "Penicillin", "Alles gewünscht", date_str(dt_days_ago(4)), date_str(dt_days_from_now(4)), "Dr. Keller"),
     ("P-100005", "Sofia Wagner",     "F", "1977-01-09", "3A", "KHK / Angina pectoris", 1,
-     "Keine", "nicht festgelegt", dt_days_ago(3), dt_days_from_now(1), "Dr. Roth"),
+     "Keine", "nicht festgelegt", date_str(dt_days_ago(3)), date_str(dt_days_from_now(1)), "Dr. Roth"),
     ("P-100006", "Nina Becker",    "F", "1983-09-30", "3B", "Hypertensive Krise", 1,
-     "Keine", "nicht festgelegt", dt_days_ago(2), dt_days_from_now(2), "Dr. Klein"),
+     "Keine", "nicht festgelegt", date_str(dt_days_ago(2)), date_str(dt_days_from_now(2)), "Dr. Klein"),
     ("P-100007", "Markus Vogt",   "M", "1990-02-12", "4A", "V.a. Myokarditis", 1,
-     "Novaligin", "nicht festgelegt", dt_days_ago(2), dt_days_from_now(5), "Dr. Keller"),
+     "Novaligin", "nicht festgelegt", date_str(dt_days_ago(2)), date_str(dt_days_from_now(5)), "Dr. Keller"),
     ("P-100008", "Paul Fuchs",     "M", "1948-06-03", "4B", "Pneumonie / Herzinsuffizienz", 1,
-     "Keine", "Keine Reha/Intub", dt_days_ago(5), dt_days_from_now(3), "Dr. Roth"),
+     "Keine", "Keine Reha/Intub", date_str(dt_days_ago(5)), date_str(dt_days_from_now(3)), "Dr. Roth"),
     ("P-100009", "Helena Wolf",    "F", "1961-12-27", "5A", "Vorhofflimmern", 1,
-     "Heparin", "nicht festgelegt", dt_days_ago(3), dt_days_from_now(4), "Dr. Klein"),
+     "Heparin", "nicht festgelegt", date_str(dt_days_ago(3)), date_str(dt_days_from_now(4)), "Dr. Klein"),
     ("P-100010", "Renate Webb",    "F", "1970-07-15", "5B", "Bradykardie / Synkope", 1,
-     "Keine", "nicht festgelegt", dt_days_ago(4), dt_days_from_now(2), "Dr. Keller"),
+     "Keine", "nicht festgelegt", date_str(dt_days_ago(4)), date_str(dt_days_from_now(2)), "Dr. Keller"),
     ("P-100011", "Jonas Root",     "M", "1961-01-21", "6A", "Diabetes / Wundinfektion", 1,
-     "Keine", "nicht festgelegt", dt_days_ago(3), dt_days_from_now(1), "Dr. Roth"),
+     "Keine", "nicht festgelegt", date_str(dt_days_ago(3)), date_str(dt_days_from_now(1)), "Dr. Roth"),
 ]
 
 cur.executemany("""
@@ -312,10 +355,7 @@ INSERT INTO patients
 (patient_identifier, name, gender, dob, room, diagnosis, bezugspflege_id,
  allergies, code_status, admission_date, expected_discharge, primary_doctor)
 VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?);
-""", [
-    (pid, name, gender, dob, room, dx, nurse_id, allergies, code, date_str(adm), date_str(dis), doc)
-    for (pid, name, gender, dob, room, dx, nurse_id, allergies, code, adm, dis, doc) in patients
-])
+""", patients)
 
 # Medications:
 # Use next_due relative to now so they show as upcoming (morning/afternoon/evening)
@@ -323,22 +363,8 @@ VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?);
 med_seed = []
 
 def add_med(patient_id: int, name: str, dose: str, route: str, schedule: str, due_dt: datetime):
-    med_seed.append((patient_id, name, dose, route, schedule, iso_minutes(due_dt), iso_minutes(due_dt)))
-
-# Define some common due times
-due_morning = next_time_today_or_tomorrow(8, 0)
-due_noon    = next_time_today_or_tomorrow(12, 0)
-due_afternoon = next_time_today_or_tomorrow(14, 0)
-due_evening = next_time_today_or_tomorrow(20, 0)
-
-
-# We'll just add patient 2 meds manually to avoid weirdness
-med_seed = [m for m in med_seed if True]  # keep list
-
-# Instead: add a helper for arbitrary offsets:
-def add_med_in_hours(patient_id, name, dose, route, schedule, hours):
-    d = now_dt() + timedelta(hours=hours)
-    med_seed.append((patient_id, name, dose, route, schedule, iso_minutes(d), iso_minutes(d)))
+    iso = iso_minutes(due_dt)  # format once; next_due and due_time share it
+    med_seed.append((patient_id, name, dose, route, schedule, iso, iso))
 
 # Patient 1
 add_med(1, "Bisoprolol", "2.5 mg", "p.o.", "1x morgens", now_dt() + timedelta(hours=0))
@@ -387,61 +413,49 @@ add_med(11, "Piperacillin/Tazobactam", "4.5 g", "i.v.", "alle 8h", now_dt() + ti
 add_med(11, "Novalgin", "500 mg", "p.o.", "2x täglich", now_dt() + timedelta(hours=0))
 add_med(11, "Humalog", "4 IE", "s.q.", "2x täglich", now_dt() + timedelta(hours=0))
 
-# Insert meds
-cur.executemany("""
-INSERT INTO medications (patient_id, name, dose, route, schedule, next_due, due_time)
-VALUES (?, ?, ?, ?, ?, ?, ?);
-""", [
-    (pid, name, dose, route, sched, iso_minutes(nd), iso_minutes(nd))
-    if isinstance(nd, datetime) else (pid, name, dose, route, sched, nd, nd)
-    for (pid, name, dose, route, sched, nd, dtv) in med_seed
-])
+# Insert meds — add_med already stores ISO strings in both due slots,
+# so the rows go in as-is. A single multi-row VALUES
+# statement keeps the VDBE from re-stepping a prepared insert per row
+# (well under SQLite's 999-parameter ceiling at 7 columns here).
+cur.execute(
+    "INSERT INTO medications (patient_id, name, dose, route, schedule, next_due, due_time) VALUES "
+    + ", ".join(["(?, ?, ?, ?, ?, ?, ?)"] * len(med_seed)),
+    list(chain.from_iterable(med_seed)),
+)
 
 # Orders/tasks (dynamic)
 orders = []
-def add_order(patient_id, desc, days_from_now, hour, minute, status, ordered_by, typ):
-    due_dt = next_time_today_or_tomorrow(hour, minute) + timedelta(days=days_from_now)
-    orders.append((
-        patient_id,
-        desc,
-        date_str(due_dt),
-        iso_minutes(due_dt),
-        status,
-        ordered_by,
-        typ
-    ))
-
-# Add a couple special orders
-add_order(1, "Blutbild - Routine", 0, 0, 0, "geplant", "Dr. Roth", "Diagnostik")
-add_order(2, "Blutbild - Routine", 0, 0, 0, "geplant", "Dr. Roth", "Diagnostik")
-add_order(3, "Blutbild - Routine", 0, 0, 0, "geplant", "Dr. Roth", "Diagnostik")
-add_order(4, "Blutbild - Routine", 0, 0, 0, "geplant", "Dr. Roth", "Diagnostik")
-add_order(5, "Blutbild - Routine", 0, 0, 0, "geplant", "Dr. Roth", "Diagnostik")
-add_order(6, "Blutbild - Routine", 0, 0, 0, "geplant", "Dr. Roth", "Diagnostik")
-add_order(7, "Blutbild - Routine", 0, 0, 0, "geplant", "Dr. Roth", "Diagnostik")
-add_order(8, "Blutbild - Routine", 0, 0, 0, "geplant", "Dr. Roth", "Diagnostik")
-add_order(9, "Blutbild - Routined", 0, 0, 0, "geplant", "Dr. Roth", "Diagnostik")
-add_order(10, "Blutbild - Routine", 0, 0, 0, "geplant", "Dr. Roth", "Diagnostik")
-add_order(11, "Blutbild - Routine", 0, 0, 0, "geplant", "Dr. Roth", "Diagnostik")
 
-cur.executemany("""
-INSERT INTO orders (patient_id, description, due_date, due_time, status, ordered_by, type)
-VALUES (?, ?, ?, ?, ?, ?, ?);
-""", orders)
+# Every patient gets the same routine blood-count order, so compute the
+# due date/time pair once and extend the list in one go (also fixes the
+# "Routined" typo patient 9 used to get).
+blutbild_dt = next_time_today_or_tomorrow(0, 0)
+blutbild_date = date_str(blutbild_dt)
+blutbild_time = iso_minutes(blutbild_dt)
+orders.extend(
+    (pid, "Blutbild - Routine", blutbild_date, blutbild_time, "geplant", "Dr. Roth", "Diagnostik")
+    for pid in range(1, 12)
+)
+
+cur.execute(
+    "INSERT INTO orders (patient_id, description, due_date, due_time, status, ordered_by, type) VALUES "
+    + ", ".join(["(?, ?, ?, ?, ?, ?, ?)"] * len(orders)),
+    list(chain.from_iterable(orders)),
+)
 
 # Notes (dynamic timestamps)
 doc_notes = [
-    (1, "Klinisch kompensiert, Diuretika angepasst.", iso_minutes(now_dt() - timedelta(hours=2)), "Dr. Keller"),
-    (2, "Post-NSTEMI, Verlauf stabil, Echo geplant.", iso_minutes(now_dt() - timedelta(hours=2)), "Dr. Roth"),
-    (3, "Vorhofflimmern, Telemetrie-Überwachung begonnen.", iso_minutes(now_dt() - timedelta(hours=2)), "Dr. Klein"),
-    (4, "Klinisch kompensiert, Diuretika angepasst.", iso_minutes(now_dt() - timedelta(hours=2)), "Dr. Roth"),
-    (5, "Verlauf stabil, Echo geplant.", iso_minutes(now_dt() - timedelta(hours=2)), "Dr. Keller"),
-    (6, "Blutdruck Medikamente angepasst.", iso_minutes(now_dt() - timedelta(hours=2)), "Dr. Roth"),
-    (7, "Telemetrie-Überwachng begonnen. Schmerzen Medikamente angesetzt.", iso_minutes(now_dt() - timedelta(hours=2)), "Dr. Klein"),
-    (8, "Pneumonie, Antibiotika laufen, O₂ Bedarf.", iso_minutes(now_dt() - timedelta(hours=2)), "Dr. Roth"),
-    (9, "Vorhofflimmern, Telemetrie-Überwachng begonnen.", iso_minutes(now_dt() - timedelta(hours=2)), "Dr. Keller"),
-    (10, "24-Stunden Blutdruck im Verlauf", iso_minutes(now_dt() - timedelta(hours=2)), "Dr. Roth"),
-    (11, "Wundinfektion am Unterschenkel. Antibiotika laufen.", iso_minutes(now_dt() - timedelta(hours=2)), "Dr. Klein"),
+    (1, "Klinisch kompensiert, Diuretika angepasst.", ago(2), "Dr. Keller"),
+    (2, "Post-NSTEMI, Verlauf stabil, Echo geplant.", ago(2), "Dr. Roth"),
+    (3, "Vorhofflimmern, Telemetrie-Überwachung begonnen.", ago(2), "Dr. Klein"),
+    (4, "Klinisch kompensiert, Diuretika angepasst.", ago(2), "Dr. Roth"),
+    (5, "Verlauf stabil, Echo geplant.", ago(2), "Dr. Keller"),
+    (6, "Blutdruck Medikamente angepasst.", ago(2), "Dr. Roth"),
+    (7, "Telemetrie-Überwachng begonnen. Schmerzen Medikamente angesetzt.", ago(2), "Dr. Klein"),
+    (8, "Pneumonie, Antibiotika laufen, O₂ Bedarf.", ago(2), "Dr. Roth"),
+    (9, "Vorhofflimmern, Telemetrie-Überwachng begonnen.", ago(2), "Dr. Keller"),
+    (10, "24-Stunden Blutdruck im Verlauf", ago(2), "Dr. Roth"),
+    (11, "Wundinfektion am Unterschenkel. Antibiotika laufen.", ago(2), "Dr. Klein"),
 ]
 cur.executemany("""
 INSERT INTO doctor_notes (patient_id, note, created_at, author)
@@ -449,53 +463,96 @@ VALUES (?, ?, ?, ?);
 """, doc_notes)
 
 nurse_notes = [
-    (1, "Patient in stabilem Zustand.", iso_minutes(now_dt() - timedelta(hours=5)), "Mia Gross"),
-    (1, "Patient in stabilem Zustand.", iso_minutes(now_dt() - timedelta(hours=24)), "Mia Gross"),
-    (2, "Patient in stabilem Zustand.", iso_minutes(now_dt() - timedelta(hours=5)), "Mia Gross"),
-    (2, "Patient in stabilem Zustand.", iso_minutes(now_dt() - timedelta(hours=24)), "Mia Gross"),
-    (3, "Patient in stabilem Zustand.", iso_minutes(now_dt() - timedelta(hours=5)), "Mia Gross"),
-    (3, "Patient in stabilem Zustand.", iso_minutes(now_dt() - timedelta(hours=24)), "Mia Gross"),
-    (4, "Patient in stabilem Zustand.", iso_minutes(now_dt() - timedelta(hours=5)), "Mia Gross"),
-    (4, "Patient in stabilem Zustand.", iso_minutes(now_dt() - timedelta(hours=24)), "Mia Gross"),
-    (5, "Patient in stabilem Zustand.", iso_minutes(now_dt() - timedelta(hours=5)), "Mia Gross"),
-    (5, "Patient in stabilem Zustand.", iso_minutes(now_dt() - timedelta(hours=24)), "Mia Gross"),
-    (6, "Patient in stabilem Zustand.", iso_minutes(now_dt() - timedelta(hours=5)), "Mia Gross"),
-    (6, "Patient in stabilem Zustand.", iso_minutes(now_dt() - timedelta(hours=24)), "Mia Gross"),
-    (7, "Patient in stabilem Zustand.", iso_minutes(now_dt() - timedelta(hours=5)), "Mia Gross"),
-    (7, "Patient in stabilem Zustand.", iso_minutes(now_dt() - timedelta(hours=24)), "Mia Gross"),
-    (8, "Patient in stabilem Zustand.", iso_minutes(now_dt() - timedelta(hours=5)), "Mia Gross"),
-    (8, "Patient in stabilem Zustand.", iso_minutes(now_dt() - timedelta(hours=24)), "Mia Gross"),
-    (9, "Patient in stabilem Zustand.", iso_minutes(now_dt() - timedelta(hours=5)), "Mia Gross"),
-    (9, "Patient in stabilem Zustand.", iso_minutes(now_dt() - timedelta(hours=24)), "Mia Gross"),
-    (10, "Patient in stabilem Zustand.", iso_minutes(now_dt() - timedelta(hours=5)), "Mia Gross"),
-    (10, "Patient in stabilem Zustand.", iso_minutes(now_dt() - timedelta(hours=24)), "Mia Gross"),
-    (11, "Patient in stabilem Zustand.", iso_minutes(now_dt() - timedelta(hours=5)), "Mia Gross"),
-    (11, "Patient in stabilem Zustand.", iso_minutes(now_dt() - timedelta(hours=24)), "Mia Gross"),
+    (1, "Patient in stabilem Zustand.", ago(5), "Mia Gross"),
+    (1, "Patient in stabilem Zustand.", ago(24), "Mia Gross"),
+    (2, "Patient in stabilem Zustand.", ago(5), "Mia Gross"),
+    (2, "Patient in stabilem Zustand.", ago(24), "Mia Gross"),
+    (3, "Patient in stabilem Zustand.", ago(5), "Mia Gross"),
+    (3, "Patient in stabilem Zustand.", ago(24), "Mia Gross"),
+    (4, "Patient in stabilem Zustand.", ago(5), "Mia Gross"),
+    (4, "Patient in stabilem Zustand.", ago(24), "Mia Gross"),
+    (5, "Patient in stabilem Zustand.", ago(5), "Mia Gross"),
+    (5, "Patient in stabilem Zustand.", ago(24), "Mia Gross"),
+    (6, "Patient in stabilem Zustand.", ago(5), "Mia Gross"),
+    (6, "Patient in stabilem Zustand.", ago(24), "Mia Gross"),
+    (7, "Patient in stabilem Zustand.", ago(5), "Mia Gross"),
+    (7, "Patient in stabilem Zustand.", ago(24), "Mia Gross"),
+    (8, "Patient in stabilem Zustand.", ago(5), "Mia Gross"),
+    (8, "Patient in stabilem Zustand.", ago(24), "Mia Gross"),
+    (9, "Patient in stabilem Zustand.", ago(5), "Mia Gross"),
+    (9, "Patient in stabilem Zustand.", ago(24), "Mia Gross"),
+    (10, "Patient in stabilem Zustand.", ago(5), "Mia Gross"),
+    (10, "Patient in stabilem Zustand.", ago(24), "Mia Gross"),
+    (11, "Patient in stabilem Zustand.", ago(5), "Mia Gross"),
+    (11, "Patient in stabilem Zustand.", ago(24), "Mia Gross"),
 ]
 cur.executemany("""
 INSERT INTO nurse_notes (patient_id, note, created_at, author)
 VALUES (?, ?, ?, ?);
 """, nurse_notes)
 
-cur.execute("SELECT id FROM patients;")
-patient_ids = [r[0] for r in cur.fetchall()]
+# Patient ids are deterministic — INTEGER PRIMARY KEY numbers the rows
+# 1..N in insert order — so there is no need to SELECT them back.
+patient_ids = range(1, len(patients) + 1)
 
-due = (datetime.now() + timedelta(hours=-1)).isoformat(timespec="minutes")
+due = ago(1)
 
+# description, category — categories mirror _TASK_CATEGORIES in app.py,
+# which the flowsheet's task auto-completion matches on.
 standard_tasks = [
-    "Vitalzeichen nach Standard",
-    "Schmerzen täglich nachfragen",
-    "Gewicht täglich messen",
+    ("Vitalzeichen nach Standard", "vitals"),
+    ("Schmerzen täglich nachfragen", "pain"),
+    ("Gewicht täglich messen", "weight"),
 ]
 
-for pid in patient_ids:
-    for desc in standard_tasks:
-        cur.execute("""
-            INSERT INTO ai_tasks (patient_id, description, due_time, completed)
-            VALUES (?, ?, ?, 0);
-        """, (pid, desc, due))
+# One prepared statement for all patient x task combinations instead of
+# a parse-and-step execute per row.
+cur.executemany("""
+    INSERT INTO ai_tasks (patient_id, description, due_time, completed, category)
+    VALUES (?, ?, ?, 0, ?);
+""", [(pid, desc, due, cat) for pid in patient_ids for desc, cat in standard_tasks])
+
+cur.execute("COMMIT")
+
+# Indexes are built after the data is in, so the seed inserts never
+# rebalance B-trees row by row. The set mirrors init_db() in app.py so a
+# freshly seeded database needs no startup migration work.
+# (executescript would commit an open transaction, hence after COMMIT.
+# On a reused file the indexes survive the DELETEs and already exist.)
+if fresh:
+    cur.executescript("""
+CREATE INDEX idx_ai_tasks_pid_open ON ai_tasks(patient_id) WHERE completed = 0;
+
+-- created_at / given_at are ISO-8601 strings, so a plain DESC index
+-- satisfies the "latest first" queries without any per-row datetime() call.
+CREATE INDEX idx_assessments_pid_created ON assessments(patient_id, created_at DESC);
+CREATE INDEX idx_nurse_notes_pid_created ON nurse_notes(patient_id, created_at DESC);
+CREATE INDEX idx_ai_alerts_pid_created ON ai_alerts(patient_id, created_at DESC);
+CREATE INDEX idx_med_admin_pid_given ON med_administrations(patient_id, given_at DESC);
+
+CREATE UNIQUE INDEX idx_ai_tasks_open_uniq
+    ON ai_tasks(patient_id, description) WHERE completed = 0;
+CREATE INDEX idx_ai_tasks_pid_desc_due
+    ON ai_tasks(patient_id, description, due_time) WHERE completed = 0;
+CREATE INDEX idx_ai_tasks_pid_category
+    ON ai_tasks(patient_id, category) WHERE completed = 0;
+CREATE INDEX idx_ai_tasks_pid_due ON ai_tasks(patient_id, due_time);
+CREATE INDEX idx_medications_open_due
+    ON medications(patient_id, name, schedule, next_due)
+    WHERE given = 0 AND not_given = 0;
+CREATE INDEX idx_medications_pid_next_due ON medications(patient_id, next_due);
+CREATE INDEX idx_med_admin_pid_nurse ON med_administrations(patient_id, nurse_id);
+CREATE INDEX idx_orders_pid_due ON orders(patient_id, due_date);
+CREATE INDEX idx_lab_orders_status_ordered ON lab_orders(status, ordered_at DESC);
+CREATE INDEX idx_lab_orders_pid_status_ordered
+    ON lab_orders(patient_id, status, ordered_at DESC);
+CREATE INDEX idx_lab_results_dt ON lab_results(result_datetime DESC);
+CREATE INDEX idx_lab_results_pid_dt ON lab_results(patient_id, result_datetime DESC);
+CREATE UNIQUE INDEX idx_patients_ident_cover ON patients(patient_identifier, name);
+""")
 
-conn.commit()
+# refresh planner statistics for whichever path ran
+cur.execute("ANALYZE;")
 conn.close()
 
 print("✅ Neue Datenbank mit 10 Patienten + dynamischen Datumswerten wurde erstellt.")